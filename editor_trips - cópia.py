@@ -1,77 +1,282 @@
+import atexit
 import json
 import os
 import re
 import sys
 import subprocess
 import datetime
+import hashlib
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+# orjson is optional: a much faster JSON codec, used for trips.json when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Tkinter is optional depending on how Python was installed (Homebrew Python often lacks _tkinter).
 try:
     import tkinter as tk
-    from tkinter import ttk, filedialog, messagebox
 except Exception as e:
     tk = None  # type: ignore
     _TK_IMPORT_ERROR = e
 else:
     _TK_IMPORT_ERROR = None
 
-DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# Loaded by _load_tk_submodules() when a window is created, so headless users of the
+# JSON/git helpers don't import them.
+ttk = filedialog = messagebox = None  # type: ignore
+
+
+def _load_tk_submodules() -> None:
+    global ttk, filedialog, messagebox
+    if messagebox is None:
+        from tkinter import ttk, filedialog, messagebox
+
+
+def _is_iso_date(s: str) -> bool:
+    """True for a real calendar date written as YYYY-MM-DD (rejects 2026-02-30)."""
+    # fromisoformat also takes other ISO forms (20260203, 2026-W05-2); pin the shape first.
+    # The plain string checks also turn away typos without raising and catching ValueError.
+    if not (len(s) == 10 and s[4] == "-" and s[7] == "-"
+            and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit()):
+        return False
+    try:
+        datetime.date.fromisoformat(s)
+    except ValueError:
+        return False
+    return True
+
+
+# OpenSSH connection sharing: the first ssh to github.com opens a master connection that
+# later pushes (and the ssh -T probe) reuse for 10 minutes, skipping the handshake.
+SSH_MUX_OPTS = [
+    "-o", "ControlMaster=auto",
+    "-o", "ControlPath=~/.ssh/cm-%r@%h:%p",
+    "-o", "ControlPersist=600",
+]
+GIT_SSH_COMMAND = " ".join(["ssh", "-o", "BatchMode=yes", *SSH_MUX_OPTS])
 
 
 # --- Git helpers ---
+_GIT_ENV: dict[str, str] | None = None
+
+
+def _git_env() -> dict[str, str]:
+    """Environment for git subprocesses, built once. Call _invalidate_git_env() after changing os.environ."""
+    global _GIT_ENV
+    if _GIT_ENV is None:
+        env = os.environ.copy()
+        # Prevent git from prompting for credentials/passphrases in a GUI-less subprocess.
+        env["GIT_TERMINAL_PROMPT"] = "0"
+        # Force ssh to be non-interactive; if a passphrase is needed, it will fail quickly.
+        env["GIT_SSH_COMMAND"] = GIT_SSH_COMMAND
+        _GIT_ENV = env
+    return _GIT_ENV
+
+
+def _invalidate_git_env() -> None:
+    global _GIT_ENV
+    _GIT_ENV = None
+
+
+def _run_captured(cmd: list[str], cwd: str, env: dict) -> tuple[int, str, str]:
+    """Run cmd and return (returncode, stdout, stderr), both stripped."""
+    p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, env=env)
+    return p.returncode, (p.stdout or "").strip(), (p.stderr or "").strip()
+
+
 def run_git(args: list[str], cwd: str) -> tuple[int, str, str]:
     """Run a git command and return (returncode, stdout, stderr). Non-interactive (won't prompt)."""
-    env = os.environ.copy()
-    # Prevent git from prompting for credentials/passphrases in a GUI-less subprocess.
-    env["GIT_TERMINAL_PROMPT"] = "0"
-    # Force ssh to be non-interactive; if a passphrase is needed, it will fail quickly.
-    env["GIT_SSH_COMMAND"] = "ssh -o BatchMode=yes"
-    p = subprocess.run(
-        ["git", *args],
-        cwd=cwd,
-        capture_output=True,
-        text=True,
-        env=env
-    )
-    return p.returncode, (p.stdout or "").strip(), (p.stderr or "").strip()
+    return _run_captured(["git", *args], cwd, _git_env())
+
+
+def run_git_script(script: str, cwd: str, env_extra: dict | None = None) -> tuple[int, str, str]:
+    """Run several git commands in a single shell process and return (returncode, stdout, stderr).
+
+    Same non-interactive environment as run_git. Extra variables (e.g. the commit message)
+    are passed via env_extra so they never need to be quoted into the script.
+    """
+    env = {**_git_env(), **env_extra} if env_extra else _git_env()
+    return _run_captured(["/bin/sh", "-c", script], cwd, env)
+
+
+# add + commit + push in one process. Each step echoes a marker so a failure can be
+# attributed to the right command. An empty index skips the commit (but still pushes).
+# With PUBLISH_PATH set only that file is staged; otherwise the whole worktree (-A).
+PUBLISH_SCRIPT = (
+    'echo "::STEP=add"\n'
+    'if [ -n "$PUBLISH_PATH" ]; then\n'
+    '  git add -- "$PUBLISH_PATH" || exit\n'
+    'else\n'
+    '  git add -A || exit\n'
+    'fi\n'
+    'echo "::STEP=commit"\n'
+    'if git diff --cached --quiet; then\n'
+    '  echo "nothing to commit"\n'
+    'else\n'
+    '  git commit -m "$PUBLISH_COMMIT_MSG" || exit\n'
+    'fi\n'
+    'echo "::STEP=push"\n'
+    'git push\n'
+)
+
+_STEP_MARKER = "::STEP="
+
+
+def _split_step_markers(out: str) -> tuple[str, str]:
+    """Return (last step reached, output without marker lines) for PUBLISH_SCRIPT output."""
+    step = ""
+    kept = []
+    for line in out.splitlines():
+        if line.startswith(_STEP_MARKER):
+            step = line[len(_STEP_MARKER):].strip()
+        else:
+            kept.append(line)
+    return step, "\n".join(kept).strip()
+
 
+def git_blob_sha1(buf: bytes) -> str:
+    """Return the object id git would give buf as a blob (same as `git hash-object`)."""
+    return hashlib.sha1(b"blob %d\0" % len(buf) + buf).hexdigest()
 
 
 def find_repo_root(start_dir: str) -> str | None:
-    """Return git repo root for start_dir, or None if not a repo."""
-    code, out, err = run_git(["rev-parse", "--show-toplevel"], cwd=start_dir)
-    if code != 0:
-        return None
-    return out
+    """Return git repo root for start_dir, or None if not a repo.
+
+    Walks up the parent directories looking for a `.git` entry (a directory, or a file
+    for linked worktrees/submodules) instead of spawning `git rev-parse`.
+    """
+    d = os.path.abspath(start_dir)
+    while True:
+        if os.path.exists(os.path.join(d, ".git")):
+            return d
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
 
 def git_pull_rebase(cwd: str) -> tuple[int, str, str]:
     """Pull remote changes with rebase (handles common Pages repos)."""
     return run_git(["pull", "--rebase", "origin", "main"], cwd=cwd)
 
 
+class GitBatchClient:
+    """Long-running `git cat-file --batch-check` process for cheap object lookups.
+
+    The process is started lazily on the first query and reused afterwards, so N
+    lookups cost one fork/exec instead of N. Thread-safe; call close() when done.
+    """
+
+    def __init__(self, repo_root: str):
+        self.repo_root = repo_root
+        self._proc: subprocess.Popen | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_proc(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch-check=%(objectname) %(objecttype)"],
+                cwd=self.repo_root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        return self._proc
+
+    def query(self, spec: str) -> str:
+        """Return git's answer for an object spec (e.g. "HEAD:trips.json").
+
+        Either "<sha> <type>" or "<spec> missing" (the spec may itself contain spaces).
+        """
+        with self._lock:
+            proc = self._ensure_proc()
+            try:
+                proc.stdin.write(spec + "\n")
+                proc.stdin.flush()
+                return proc.stdout.readline().strip()
+            except (BrokenPipeError, OSError):
+                # Helper died (e.g. repo moved); drop it so the next query restarts it.
+                self._proc = None
+                return f"{spec} missing"
+
+    def object_id(self, spec: str) -> str | None:
+        """Return the object sha for spec, or None if it does not exist."""
+        line = self.query(spec)
+        # Test the fixed suffix, not the field count: "HEAD:my trips.json missing" has three fields too.
+        if not line or line.endswith((" missing", " ambiguous")):
+            return None
+        return line.partition(" ")[0]
+
+    def close(self) -> None:
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+
+
+def json_matches_head(batch: GitBatchClient, rel: str, path: str,
+                      saved_bytes: bytes | None, saved_stat: tuple[int, int] | None) -> bool:
+    """True if the JSON file at path is byte-identical to HEAD:rel.
+
+    saved_bytes/saved_stat: what the editor last wrote to path and file_stat_key right after; the bytes
+    stand in for the file only while nobody else (an editor, git pull) rewrote it.
+    """
+    head_sha = batch.object_id(f"HEAD:{rel}")
+    if head_sha is None:
+        return False
+    buf = saved_bytes
+    if buf is not None and file_stat_key(path) != saved_stat:
+        buf = None
+    if buf is None:
+        try:
+            with open(path, "rb") as f:
+                buf = f.read()
+        except OSError:
+            return False
+    return git_blob_sha1(buf) == head_sha
+
+
+def publish_is_push_only(batch: GitBatchClient, rel: str, path: str, saved_bytes: bytes | None,
+                         saved_stat: tuple[int, int] | None, whole_tree: bool) -> bool:
+    """True if there is nothing to commit: the JSON matches HEAD and, when the whole tree is
+    published, `git status` is clean too."""
+    if not json_matches_head(batch, rel, path, saved_bytes, saved_stat):
+        return False
+    if not whole_tree:
+        return True
+    scode, sout, serr = run_git(["status", "--porcelain"], cwd=batch.repo_root)
+    return scode == 0 and not sout
+
+
 # --- SSH agent/key helpers ---
+# Typical lines:
+# SSH_AUTH_SOCK=/var/folders/.../agent.12345; export SSH_AUTH_SOCK;
+# SSH_AGENT_PID=12345; export SSH_AGENT_PID;
+_AGENT_VAR_RE = re.compile(r"^[ \t]*(SSH_AUTH_SOCK|SSH_AGENT_PID)=([^;\r\n]+)", re.M)
+
+
 def _parse_ssh_agent_output(agent_out: str) -> dict:
     """Parse `ssh-agent -s` output and return env vars."""
-    env_vars: dict[str, str] = {}
-    # Typical lines:
-    # SSH_AUTH_SOCK=/var/folders/.../agent.12345; export SSH_AUTH_SOCK;
-    # SSH_AGENT_PID=12345; export SSH_AGENT_PID;
-    for line in agent_out.splitlines():
-        line = line.strip()
-        if line.startswith("SSH_AUTH_SOCK="):
-            val = line.split("SSH_AUTH_SOCK=", 1)[1].split(";", 1)[0]
-            if val:
-                env_vars["SSH_AUTH_SOCK"] = val
-        elif line.startswith("SSH_AGENT_PID="):
-            val = line.split("SSH_AGENT_PID=", 1)[1].split(";", 1)[0]
-            if val:
-                env_vars["SSH_AGENT_PID"] = val
-    return env_vars
+    return dict(_AGENT_VAR_RE.findall(agent_out))
 
 
 def _prompt_passphrase(parent) -> str | None:
     """Prompt for SSH key passphrase (hidden). Returns None if cancelled."""
+    _load_tk_submodules()
     win = tk.Toplevel(parent)
     win.title("Senha da chave SSH")
     win.transient(parent)
@@ -128,22 +333,24 @@ def _prompt_passphrase(parent) -> str | None:
     return result["value"]
 
 
-def ensure_ssh_auth_ready(parent) -> bool:
-    """Ensure an ssh-agent is running and the key is loaded. Returns True if ready."""
-    # 1) If we already have identities, we're good.
+def ssh_agent_has_identities() -> bool:
+    """Return True if the running ssh-agent already has at least one key loaded."""
+    # ssh-add -l exits 0 only when it listed keys (1: agent has no identities, 2: no agent),
+    # so the listing itself is never needed.
     try:
         p = subprocess.run(
             ["ssh-add", "-l"],
-            capture_output=True,
-            text=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             env=os.environ.copy(),
         )
-        if p.returncode == 0 and p.stdout and "The agent has no identities" not in p.stdout:
-            return True
+        return p.returncode == 0
     except Exception:
-        pass
+        return False
 
-    # 2) Start agent (or refresh env vars) so ssh-add can talk to it.
+
+def start_ssh_agent() -> tuple[dict[str, str], str]:
+    """Start an ssh-agent and return (env vars, error message)."""
     agent = subprocess.run(
         ["ssh-agent", "-s"],
         capture_output=True,
@@ -151,93 +358,78 @@ def ensure_ssh_auth_ready(parent) -> bool:
         env=os.environ.copy(),
     )
     if agent.returncode != 0:
-        messagebox.showerror("GitHub", f"Falha ao iniciar ssh-agent.\n\n{(agent.stderr or agent.stdout).strip()}")
-        return False
+        return {}, (agent.stderr or agent.stdout).strip()
+    return _parse_ssh_agent_output(agent.stdout or ""), ""
 
-    env_vars = _parse_ssh_agent_output(agent.stdout or "")
-    if not env_vars.get("SSH_AUTH_SOCK"):
-        messagebox.showerror("GitHub", "Não consegui obter SSH_AUTH_SOCK do ssh-agent.")
-        return False
 
-    # Apply to current process so all subsequent git/ssh calls inherit it.
-    os.environ.update(env_vars)
+_ASKPASS_PATH: str | None = None
 
-    # 3) Add key (with GUI passphrase prompt via SSH_ASKPASS to avoid terminal interaction).
-    key_path = os.path.expanduser("~/.ssh/id_ed25519")
-    if not os.path.exists(key_path):
-        messagebox.showerror(
-            "GitHub",
-            "Não encontrei a chave SSH em ~/.ssh/id_ed25519.\n\n"
-            "Verifique o caminho da chave ou gere uma nova chave (ssh-keygen).",
-        )
-        return False
 
-    passphrase = _prompt_passphrase(parent)
-    if passphrase is None:
-        return False
+def _askpass_helper() -> str:
+    """Path of an askpass script that prints $SSH_PASSPHRASE; written once per run.
 
-    # Create a temporary askpass script that prints the passphrase.
-    # Note: this keeps the passphrase only in memory/env during this call.
-    askpass_path = None
-    try:
-        fd, askpass_path = tempfile.mkstemp(prefix="askpass_", text=True)
-        os.close(fd)
-        with open(askpass_path, "w", encoding="utf-8") as f:
+    The script holds no secret (the passphrase only travels in the child's env), so it is
+    kept for the life of the process and removed at exit.
+    """
+    global _ASKPASS_PATH
+    if _ASKPASS_PATH is None or not os.path.exists(_ASKPASS_PATH):
+        fd, path = tempfile.mkstemp(prefix="askpass_", text=True)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
             f.write("#!/bin/sh\n")
             f.write('printf "%s" "$SSH_PASSPHRASE"\n')
-        os.chmod(askpass_path, 0o700)
+        os.chmod(path, 0o700)
+        atexit.register(_remove_askpass_helper, path)
+        _ASKPASS_PATH = path
+    return _ASKPASS_PATH
 
-        env = os.environ.copy()
-        env["SSH_ASKPASS"] = askpass_path
-        env["SSH_ASKPASS_REQUIRE"] = "force"
-        env["SSH_PASSPHRASE"] = passphrase
-        # Prevent ssh-add from trying to read from stdin/tty and hanging.
-        env["DISPLAY"] = env.get("DISPLAY", ":0")
-
-        add = subprocess.run(
-            ["ssh-add", "--apple-use-keychain", key_path],
-            capture_output=True,
-            text=True,
-            env=env,
-            stdin=subprocess.DEVNULL,
-            start_new_session=True,
-        )
-        if add.returncode != 0:
-            details = (add.stderr or add.stdout).strip()
-            messagebox.showerror(
-                "GitHub",
-                "Não consegui adicionar a chave ao ssh-agent.\n\n"
-                f"{details}\n\n"
-                "Se a senha estiver incorreta, tente novamente.\n"
-                "Se sua chave não tiver senha, tente OK com o campo em branco.",
-            )
-            return False
-    finally:
-        # Best effort cleanup
-        try:
-            if askpass_path and os.path.exists(askpass_path):
-                os.remove(askpass_path)
-        except Exception:
-            pass
 
-    return True
+def _remove_askpass_helper(path: str) -> None:
+    # Best effort cleanup
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
-def test_github_ssh(parent) -> None:
-    """Run `ssh -T git@github.com` and show a friendly message."""
+def ssh_add_key(key_path: str, passphrase: str) -> tuple[int, str]:
+    """Add key_path to the agent, answering the passphrase via SSH_ASKPASS. Returns (returncode, details)."""
+    env = os.environ.copy()
+    env["SSH_ASKPASS"] = _askpass_helper()
+    env["SSH_ASKPASS_REQUIRE"] = "force"
+    env["SSH_PASSPHRASE"] = passphrase
+    # Prevent ssh-add from trying to read from stdin/tty and hanging.
+    env["DISPLAY"] = env.get("DISPLAY", ":0")
+
+    add = subprocess.run(
+        ["ssh-add", "--apple-use-keychain", key_path],
+        capture_output=True,
+        text=True,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    return add.returncode, (add.stderr or add.stdout).strip()
+
+
+def probe_github_ssh() -> tuple[int, str]:
+    """Run `ssh -T git@github.com` and return (returncode, combined output)."""
     p = subprocess.run(
-        ["ssh", "-T", "git@github.com"],
+        ["ssh", *SSH_MUX_OPTS, "-T", "git@github.com"],
         capture_output=True,
         text=True,
         env=os.environ.copy(),
     )
-    out = ((p.stdout or "") + "\n" + (p.stderr or "")).strip()
+    return p.returncode, ((p.stdout or "") + "\n" + (p.stderr or "")).strip()
+
+
+def report_github_ssh(code: int, out: str) -> None:
+    """Show a friendly message for the result of probe_github_ssh()."""
     # GitHub often returns exit code 1 even on success (auth success but no shell).
     if ("successfully authenticated" in out.lower()) or ("welcome" in out.lower()):
         messagebox.showinfo("GitHub", "Conexão SSH com GitHub OK ✅")
         return
     # Only show details if something looks wrong.
-    if p.returncode != 0:
+    if code != 0:
         messagebox.showwarning(
             "GitHub",
             "Teste SSH com GitHub retornou uma mensagem.\n\n"
@@ -249,6 +441,7 @@ def test_github_ssh(parent) -> None:
 # --- Simple prompt dialog ---
 def simple_prompt(parent, title: str, label: str, default: str = "") -> str | None:
     """Small modal prompt to ask for a single line string."""
+    _load_tk_submodules()
     win = tk.Toplevel(parent)
     win.title(title)
     win.transient(parent)
@@ -297,29 +490,103 @@ def simple_prompt(parent, title: str, label: str, default: str = "") -> str | No
 
 
 def safe_load_json(path: str) -> dict:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if orjson is not None:
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
     if not isinstance(data, dict) or "trips" not in data or not isinstance(data["trips"], list):
         raise ValueError('JSON inválido. Esperado: { "trips": [ ... ] }')
     return data
 
 
-def safe_save_json(path: str, data: dict) -> None:
+def _dump_json_bytes(data: dict) -> bytes:
+    """UTF-8, 2-space indented JSON; orjson and the stdlib produce the same bytes for trips."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib handles those
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def file_stat_key(path: str) -> tuple[int, int] | None:
+    """(st_mtime_ns, st_size) of path, or None if it can't be stat'ed; changes when the file is rewritten."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def safe_save_json(path: str, data: dict, previous: bytes | None = None,
+                   previous_stat: tuple[int, int] | None = None) -> bytes:
     # Salva “bonitinho” e estável
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # Serialize once and write the bytes in a single call to a temp file, then swap it in
+    # atomically. Returns the bytes written so callers can hash them without re-serializing.
+    # If they equal `previous` (what the caller last wrote to path) and the file still has the
+    # file_stat_key recorded after that write (`previous_stat`), the write is skipped.
+    buf = _dump_json_bytes(data)
+    if buf == previous and previous_stat is not None and file_stat_key(path) == previous_stat:
+        return buf
+    tmp = path + ".tmp"
+    # Raw fd: no buffered-writer layer between the bytes and write(2).
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        view = memoryview(buf)
+        while view:
+            view = view[os.write(fd, view):]
+        # Flush to disk before the rename so a crash can't leave an empty trips.json behind.
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+    return buf
+
+
+def copy_trip(t: dict) -> dict:
+    """Copy a trip so edits to the copy never reach the original.
+
+    Trips are flat apart from `stops` (list of str) and `bookings` (list of flat dicts),
+    so copying just those containers is enough.
+    """
+    dup = dict(t)
+    if isinstance(dup.get("stops"), list):
+        dup["stops"] = list(dup["stops"])
+    if isinstance(dup.get("bookings"), list):
+        dup["bookings"] = [dict(b) if isinstance(b, dict) else b for b in dup["bookings"]]
+    return dup
+
+
+_BOOKING_FIELDS = itemgetter("name", "from", "to")
+
+
+def booking_row(b: dict) -> tuple:
+    """(name, from, to) for the bookings table; missing fields show as ""."""
+    try:
+        return _BOOKING_FIELDS(b)  # one C call for the usual complete booking
+    except KeyError:
+        return (b.get("name", ""), b.get("from", ""), b.get("to", ""))
+
+
+def trip_sort_key(t: dict) -> tuple[str, str, str]:
+    return (t.get("date", ""), t.get("direction", ""), t.get("id", ""))
+
+
+_DIR_LABELS = {"ida": "IDA", "volta": "VOLTA"}
 
 
 def make_trip_label(t: dict) -> str:
-    date = t.get("date", "????-??-??")
     direction = t.get("direction", "?")
+    base = f'{t.get("date", "????-??-??")} • {_DIR_LABELS.get(direction, direction)}'
     title = t.get("title", "")
-    short = "IDA" if direction == "ida" else ("VOLTA" if direction == "volta" else direction)
-    return f"{date} • {short} • {title}".strip(" •")
+    return f"{base} • {title}" if title else base
 
 
 class TripsEditorApp(tk.Tk):
     def __init__(self):
+        _load_tk_submodules()
         super().__init__()
         self.title("Editor de trips.json")
         self.geometry("1100x680")
@@ -330,11 +597,44 @@ class TripsEditorApp(tk.Tk):
         self.current_index: int | None = None
         self.dirty = False
         self._publishing = False
+        self._publish_step_pending = False  # a git step of the current publish is on the I/O pool
+        self._git_batch: GitBatchClient | None = None
+        # ssh/git network calls can block for seconds; they run here, never on the Tk thread.
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        self._ssh_ready = False  # key known to be loaded in the agent; reset on auth failures
+        self._pending_select: str | None = None  # after() id of a deferred on_select_trip
+        self._trip_labels: list[str] = []  # Listbox text per trip, same order as data["trips"]
+        self._trip_index_by_id: dict[str, int] = {}  # rebuilt by refresh_ui; -1 marks an id used twice
+        self._last_saved_bytes: bytes | None = None  # what save_file last wrote to file_path
+        self._last_saved_stat: tuple[int, int] | None = None  # file_stat_key right after that write
 
         self._build_ui()
         self._bind_shortcuts()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.refresh_ui()
 
+    def _get_git_batch(self, repo_root: str) -> GitBatchClient:
+        """Return the persistent git helper for repo_root (recreated if the repo changed)."""
+        if self._git_batch is None or self._git_batch.repo_root != repo_root:
+            if self._git_batch is not None:
+                self._git_batch.close()
+            self._git_batch = GitBatchClient(repo_root)
+        return self._git_batch
+
+    def _json_relpath(self, repo_root: str) -> str | None:
+        """Path of the open JSON file relative to repo_root (git style), or None if outside it."""
+        if not self.file_path:
+            return None
+        rel = os.path.relpath(self.file_path, repo_root).replace(os.sep, "/")
+        return None if rel.startswith("../") else rel
+
+    def on_close(self):
+        if self._git_batch is not None:
+            self._git_batch.close()
+            self._git_batch = None
+        self._io_pool.shutdown(wait=False)
+        self.destroy()
+
     # ---------- UI ----------
     def _build_ui(self):
         # Topbar
@@ -352,6 +652,9 @@ class TripsEditorApp(tk.Tk):
         ttk.Button(btns, text="Salvar como…", command=self.save_file_as).pack(side=tk.LEFT, padx=4)
         self.btn_publish = ttk.Button(btns, text="Publicar no GitHub", command=self.publish_to_github)
         self.btn_publish.pack(side=tk.LEFT, padx=4)
+        # Off: publish stages only the JSON file (fast on big repos). On: git add -A, for assets too.
+        self.var_publish_all = tk.BooleanVar(value=False)
+        ttk.Checkbutton(btns, text="Incluir outros arquivos", variable=self.var_publish_all).pack(side=tk.LEFT, padx=4)
 
         # Main split
         main = ttk.PanedWindow(self, orient=tk.HORIZONTAL)
@@ -413,7 +716,8 @@ class TripsEditorApp(tk.Tk):
         bookings_frame = ttk.Frame(right)
         bookings_frame.pack(fill=tk.BOTH, expand=True, pady=(6, 0))
 
-        self.bookings = ttk.Treeview(bookings_frame, columns=("name", "from", "to"), show="headings", height=10)
+        self.bookings = ttk.Treeview(bookings_frame, columns=("name", "from", "to"), show="headings", height=10,
+                                     selectmode="extended")
         self.bookings.heading("name", text="Nome")
         self.bookings.heading("from", text="De")
         self.bookings.heading("to", text="Para")
@@ -463,163 +767,328 @@ class TripsEditorApp(tk.Tk):
         self.bind("<Control-s>", lambda e: self.save_file())
         self.bind("<Control-o>", lambda e: self.open_file())
 
-    def publish_to_github(self):
-        if getattr(self, "_publishing", False):
-            return
-        self._publishing = True
-        try:
+    # ---------- Background work ----------
+    def _run_in_background(self, func, *args, on_done, on_error=None):
+        """Run func(*args) on the I/O pool and hand its result to on_done on the Tk thread."""
+        fut = self._io_pool.submit(func, *args)
+
+        def poll():
+            if not fut.done():
+                self.after(30, poll)
+                return
             try:
-                self.btn_publish.configure(state=tk.DISABLED)
-            except Exception:
-                pass
-            # Choose a folder to run git commands from:
-            # - if a json file is open, use its folder
-            # - otherwise use the folder containing this script
-            base_dir = os.path.dirname(self.file_path) if self.file_path else os.path.dirname(os.path.abspath(__file__))
+                result = fut.result()
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+                return
+            on_done(result)
+
+        self.after(30, poll)
+
+    def _ensure_ssh_auth_ready(self, on_done) -> None:
+        """Ensure an ssh-agent is running and the key is loaded, then call on_done(ready).
+
+        The ssh-add/ssh-agent processes run on the I/O pool; dialogs stay on the Tk thread.
+        """
+        # Once the key is in the agent it stays there for the life of the app.
+        if self._ssh_ready:
+            on_done(True)
+            return
+
+        def ready():
+            self._ssh_ready = True
+            on_done(True)
+
+        def fail(e):
+            messagebox.showerror("GitHub", f"Falha ao preparar a autenticação SSH.\n\n{e}")
+            on_done(False)
+
+        def after_probe(has_identities):
+            # 1) If we already have identities, we're good.
+            if has_identities:
+                ready()
+                return
+            # 2) Start agent (or refresh env vars) so ssh-add can talk to it.
+            self._run_in_background(start_ssh_agent, on_done=after_agent, on_error=fail)
+
+        def after_agent(result):
+            env_vars, error = result
+            if error:
+                messagebox.showerror("GitHub", f"Falha ao iniciar ssh-agent.\n\n{error}")
+                on_done(False)
+                return
+            if not env_vars.get("SSH_AUTH_SOCK"):
+                messagebox.showerror("GitHub", "Não consegui obter SSH_AUTH_SOCK do ssh-agent.")
+                on_done(False)
+                return
+
+            # Apply to current process so all subsequent git/ssh calls inherit it.
+            os.environ.update(env_vars)
+            _invalidate_git_env()
 
-            repo_root = find_repo_root(base_dir)
-            if not repo_root:
+            # 3) Add key (with GUI passphrase prompt via SSH_ASKPASS to avoid terminal interaction).
+            key_path = os.path.expanduser("~/.ssh/id_ed25519")
+            if not os.path.exists(key_path):
                 messagebox.showerror(
                     "GitHub",
-                    "Não encontrei um repositório Git neste diretório.\n\n"
-                    "Dica: abra esta pasta no terminal e rode:\n"
-                    "  git init  (se ainda não)\n"
-                    "  git remote add origin <SSH>\n"
-                    "  git add .\n  git commit -m \"primeiro commit\"\n  git push -u origin main"
+                    "Não encontrei a chave SSH em ~/.ssh/id_ed25519.\n\n"
+                    "Verifique o caminho da chave ou gere uma nova chave (ssh-keygen).",
                 )
+                on_done(False)
                 return
 
-            # Ensure SSH agent/key are ready (avoids needing a separate terminal to type passphrase).
-            if not ensure_ssh_auth_ready(self):
+            passphrase = _prompt_passphrase(self)
+            if passphrase is None:
+                on_done(False)
                 return
-            # Optional: quick diagnostic (doesn't block publishing if GitHub returns non-zero on success)
-            try:
-                test_github_ssh(self)
-            except Exception:
-                pass
+            self._run_in_background(ssh_add_key, key_path, passphrase, on_done=after_add, on_error=fail)
 
-            # Ensure file is saved first
-            if self.dirty:
-                if not messagebox.askyesno("GitHub", "Você tem alterações não salvas. Salvar antes de publicar?"):
-                    return
-                self.save_file()
-                if self.dirty:
-                    return  # save failed or user canceled
-
-            # Ask commit message
-            default_msg = f"atualiza calendário ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M')})"
-            msg = simple_prompt(self, "Mensagem do commit", "Digite uma mensagem para o commit:", default_msg)
-            if msg is None:
+        def after_add(result):
+            code, details = result
+            if code != 0:
+                messagebox.showerror(
+                    "GitHub",
+                    "Não consegui adicionar a chave ao ssh-agent.\n\n"
+                    f"{details}\n\n"
+                    "Se a senha estiver incorreta, tente novamente.\n"
+                    "Se sua chave não tiver senha, tente OK com o campo em branco.",
+                )
+                on_done(False)
                 return
-            msg = msg.strip() or default_msg
+            ready()
 
-            # Stage files (you can limit to trips.json if you prefer, but staging all is safer for assets)
-            code, out, err = run_git(["add", "-A"], cwd=repo_root)
-            if code != 0:
-                messagebox.showerror("GitHub", f"Falha no git add.\n\n{err or out}")
+        self._run_in_background(ssh_agent_has_identities, on_done=after_probe, on_error=fail)
+
+    # ---------- GitHub ----------
+    def publish_to_github(self):
+        if getattr(self, "_publishing", False):
+            return
+        self._publishing = True
+        try:
+            self.btn_publish.configure(state=tk.DISABLED)
+        except Exception:
+            pass
+        # Choose a folder to run git commands from:
+        # - if a json file is open, use its folder
+        # - otherwise use the folder containing this script
+        base_dir = os.path.dirname(self.file_path) if self.file_path else os.path.dirname(os.path.abspath(__file__))
+
+        repo_root = find_repo_root(base_dir)
+        if not repo_root:
+            messagebox.showerror(
+                "GitHub",
+                "Não encontrei um repositório Git neste diretório.\n\n"
+                "Dica: abra esta pasta no terminal e rode:\n"
+                "  git init  (se ainda não)\n"
+                "  git remote add origin <SSH>\n"
+                "  git add .\n  git commit -m \"primeiro commit\"\n  git push -u origin main"
+            )
+            self._end_publish()
+            return
+
+        # Ensure SSH agent/key are ready (avoids needing a separate terminal to type passphrase).
+        # The ssh steps run off the Tk thread; publishing continues in the callbacks below.
+        self._ensure_ssh_auth_ready(lambda ready: self._publish_after_ssh(repo_root, ready))
+
+    def _end_publish(self):
+        self._publishing = False
+        try:
+            self.btn_publish.configure(state=tk.NORMAL)
+        except Exception:
+            pass
+
+    def _publish_after_ssh(self, repo_root: str, ready: bool):
+        if not ready:
+            self._end_publish()
+            return
+        # Optional: quick diagnostic (doesn't block publishing if GitHub returns non-zero on success)
+        self._run_in_background(
+            probe_github_ssh,
+            on_done=lambda result: self._publish_after_ssh_test(repo_root, result),
+            on_error=lambda e: self._publish_after_ssh_test(repo_root, None),
+        )
+
+    def _publish_after_ssh_test(self, repo_root: str, probe: tuple[int, str] | None):
+        try:
+            if probe is not None:
+                try:
+                    report_github_ssh(*probe)
+                except Exception:
+                    pass
+            self._publish_commit_and_push(repo_root)
+        finally:
+            if not self._publish_step_pending:
+                self._end_publish()
+
+    def _publish_step(self, func, *args, then):
+        """Run a git step on the I/O pool and continue with then(result) on the Tk thread.
+
+        Publishing ends (button re-enabled) once a `then` returns without starting another step.
+        """
+        self._publish_step_pending = True
+
+        def done(result):
+            self._publish_step_pending = False
+            try:
+                then(result)
+            finally:
+                if not self._publish_step_pending:
+                    self._end_publish()
+
+        def failed(e):
+            self._publish_step_pending = False
+            messagebox.showerror("GitHub", f"Erro inesperado ao publicar.\n\n{e}")
+            self._end_publish()
+
+        self._run_in_background(func, *args, on_done=done, on_error=failed)
+
+    def _publish_commit_and_push(self, repo_root: str):
+        # Ensure file is saved first
+        if self.dirty:
+            if not messagebox.askyesno("GitHub", "Você tem alterações não salvas. Salvar antes de publicar?"):
                 return
+            self.save_file()
+            if self.dirty:
+                return  # save failed or user canceled
 
-            # Commit (may fail if nothing to commit)
-            code, out, err = run_git(["commit", "-m", msg], cwd=repo_root)
-            if code != 0:
-                # If nothing to commit, allow pushing anyway (useful when remote changed, etc.)
-                if "nothing to commit" not in (out + " " + err).lower():
-                    messagebox.showerror("GitHub", f"Falha no git commit.\n\n{err or out}")
-                    return
+        # Stage just the JSON unless asked to include everything (or there is no JSON in the repo).
+        add_path = None if self.var_publish_all.get() else self._json_relpath(repo_root)
 
-            # Push
-            code, out, err = run_git(["push"], cwd=repo_root)
-            if code != 0:
-                msg_all = (out + "\n" + err).strip().lower()
-
-                # Common case: remote has commits not present locally (fetch first / rejected)
-                if ("fetch first" in msg_all) or ("rejected" in msg_all) or ("non-fast-forward" in msg_all):
-                    choice = messagebox.askyesnocancel(
-                        "GitHub",
-                        "O repositório remoto já tem commits e o push foi rejeitado.\n\n"
-                        "SIM  → Integrar mudanças do remoto (git pull --rebase) e tentar de novo (recomendado)\n"
-                        "NÃO  → Forçar push e sobrescrever o remoto (git push --force)\n"
-                        "CANCELAR → Não fazer nada agora"
-                    )
-                    if choice is None:
-                        return
-
-                    if choice is True:
-                        pcode, pout, perr = git_pull_rebase(repo_root)
-                        if pcode != 0:
-                            messagebox.showerror(
-                                "GitHub",
-                                "Falha ao integrar mudanças do remoto (git pull --rebase).\n\n"
-                                f"{perr or pout}\n\n"
-                                "Se aparecer conflito, resolva no VS Code e rode novamente.\n"
-                                "Dica terminal:\n"
-                                "  git status\n"
-                                "  git rebase --continue\n"
-                                "  git rebase --abort"
-                            )
-                            return
-
-                        # Try push again
-                        code2, out2, err2 = run_git(["push"], cwd=repo_root)
-                        if code2 != 0:
-                            messagebox.showerror("GitHub", f"Falha no git push após pull --rebase.\n\n{err2 or out2}")
-                            return
-
-                        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
-                        return
-
-                    # Force push (overwrite remote)
-                    fcode, fout, ferr = run_git(["push", "--force"], cwd=repo_root)
-                    if fcode != 0:
-                        messagebox.showerror("GitHub", f"Falha no git push --force.\n\n{ferr or fout}")
-                        return
-
-                    messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
+        # If the JSON is byte-identical to HEAD and nothing else would be staged, there is
+        # nothing to commit: skip the message prompt and add/commit and just push.
+        # The cat-file/status probes run on the I/O pool like the other publish steps.
+        rel = self._json_relpath(repo_root)
+        if rel is None:
+            self._publish_after_push_check(repo_root, add_path, False)
+            return
+        self._publish_step(
+            publish_is_push_only, self._get_git_batch(repo_root), rel, self.file_path,
+            self._last_saved_bytes, self._last_saved_stat, add_path is None,
+            then=lambda push_only: self._publish_after_push_check(repo_root, add_path, push_only),
+        )
+
+    def _publish_after_push_check(self, repo_root: str, add_path: str | None, push_only: bool):
+        if push_only:
+            self._publish_step(run_git, ["push"], repo_root, then=lambda res: self._publish_after_push(repo_root, *res))
+            return
+
+        # Ask commit message
+        default_msg = f"atualiza calendário ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M')})"
+        msg = simple_prompt(self, "Mensagem do commit", "Digite uma mensagem para o commit:", default_msg)
+        if msg is None:
+            return
+        msg = msg.strip() or default_msg
+
+        # Stage, commit (skipped if nothing is staged) and push in a single shell process.
+        self._publish_step(
+            run_git_script, PUBLISH_SCRIPT, repo_root, {"PUBLISH_COMMIT_MSG": msg, "PUBLISH_PATH": add_path or ""},
+            then=lambda res: self._publish_after_script(repo_root, *res),
+        )
+
+    def _publish_after_script(self, repo_root: str, code: int, out: str, err: str):
+        step, out = _split_step_markers(out)
+        if code != 0 and step == "add":
+            messagebox.showerror("GitHub", f"Falha no git add.\n\n{err or out}")
+            return
+        if code != 0 and step == "commit":
+            messagebox.showerror("GitHub", f"Falha no git commit.\n\n{err or out}")
+            return
+        self._publish_after_push(repo_root, code, out, err)
+
+    def _publish_after_push(self, repo_root: str, code: int, out: str, err: str):
+        # Push failed
+        if code != 0:
+            msg_all = (out + "\n" + err).strip().lower()
+
+            # Common case: remote has commits not present locally (fetch first / rejected)
+            if ("fetch first" in msg_all) or ("rejected" in msg_all) or ("non-fast-forward" in msg_all):
+                choice = messagebox.askyesnocancel(
+                    "GitHub",
+                    "O repositório remoto já tem commits e o push foi rejeitado.\n\n"
+                    "SIM  → Integrar mudanças do remoto (git pull --rebase) e tentar de novo (recomendado)\n"
+                    "NÃO  → Forçar push e sobrescrever o remoto (git push --force)\n"
+                    "CANCELAR → Não fazer nada agora"
+                )
+                if choice is None:
                     return
 
-                # Other push errors
-                details = (err or out).strip()
-                low = (out + "\n" + err).lower()
-
-                if ("permission denied" in low) or ("publickey" in low) or ("could not read from remote repository" in low) or ("host key verification failed" in low) or ("batchmode" in low):
-                    messagebox.showerror(
-                        "GitHub",
-                        "Falha de autenticação SSH ao publicar.\n\n"
-                        f"{details}\n\n"
-                        "Como corrigir (no Terminal):\n"
-                        "1) Teste:  ssh -T git@github.com\n"
-                        "2) Carregue a chave no agente (macOS):\n"
-                        "   eval \"$(ssh-agent -s)\"\n"
-                        "   ssh-add --apple-use-keychain ~/.ssh/id_ed25519\n"
-                        "3) Confirme: ssh-add -l\n"
-                        "4) Tente novamente o push.\n\n"
-                        "Se sua rede bloquear a porta 22, configure GitHub via 443 em ~/.ssh/config:\n"
-                        "Host github.com\n"
-                        "  HostName ssh.github.com\n"
-                        "  User git\n"
-                        "  Port 443\n"
-                        "  IdentityFile ~/.ssh/id_ed25519\n"
-                    )
+                if choice is True:
+                    self._publish_step(git_pull_rebase, repo_root, then=lambda res: self._publish_after_pull(repo_root, *res))
                     return
 
+                # Force push (overwrite remote)
+                self._publish_step(run_git, ["push", "--force"], repo_root, then=lambda res: self._publish_after_force(*res))
+                return
+
+            # Other push errors
+            details = (err or out).strip()
+            low = (out + "\n" + err).lower()
+
+            if ("permission denied" in low) or ("publickey" in low) or ("could not read from remote repository" in low) or ("host key verification failed" in low) or ("batchmode" in low):
+                self._ssh_ready = False  # probe the agent again on the next publish
                 messagebox.showerror(
                     "GitHub",
-                    "Falha no git push.\n\n"
+                    "Falha de autenticação SSH ao publicar.\n\n"
                     f"{details}\n\n"
-                    "Dica: no terminal, confira:\n"
-                    "  git remote -v\n"
-                    "  git status\n"
-                    "  git branch\n"
+                    "Como corrigir (no Terminal):\n"
+                    "1) Teste:  ssh -T git@github.com\n"
+                    "2) Carregue a chave no agente (macOS):\n"
+                    "   eval \"$(ssh-agent -s)\"\n"
+                    "   ssh-add --apple-use-keychain ~/.ssh/id_ed25519\n"
+                    "3) Confirme: ssh-add -l\n"
+                    "4) Tente novamente o push.\n\n"
+                    "Se sua rede bloquear a porta 22, configure GitHub via 443 em ~/.ssh/config:\n"
+                    "Host github.com\n"
+                    "  HostName ssh.github.com\n"
+                    "  User git\n"
+                    "  Port 443\n"
+                    "  IdentityFile ~/.ssh/id_ed25519\n"
                 )
                 return
 
-            messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
-        finally:
-            self._publishing = False
-            try:
-                self.btn_publish.configure(state=tk.NORMAL)
-            except Exception:
-                pass
+            messagebox.showerror(
+                "GitHub",
+                "Falha no git push.\n\n"
+                f"{details}\n\n"
+                "Dica: no terminal, confira:\n"
+                "  git remote -v\n"
+                "  git status\n"
+                "  git branch\n"
+            )
+            return
+
+        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
+
+    def _publish_after_pull(self, repo_root: str, pcode: int, pout: str, perr: str):
+        if pcode != 0:
+            messagebox.showerror(
+                "GitHub",
+                "Falha ao integrar mudanças do remoto (git pull --rebase).\n\n"
+                f"{perr or pout}\n\n"
+                "Se aparecer conflito, resolva no VS Code e rode novamente.\n"
+                "Dica terminal:\n"
+                "  git status\n"
+                "  git rebase --continue\n"
+                "  git rebase --abort"
+            )
+            return
+
+        # Try push again
+        self._publish_step(run_git, ["push"], repo_root, then=lambda res: self._publish_after_retry(*res))
+
+    def _publish_after_retry(self, code2: int, out2: str, err2: str):
+        if code2 != 0:
+            messagebox.showerror("GitHub", f"Falha no git push após pull --rebase.\n\n{err2 or out2}")
+            return
+        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
+
+    def _publish_after_force(self, fcode: int, fout: str, ferr: str):
+        if fcode != 0:
+            messagebox.showerror("GitHub", f"Falha no git push --force.\n\n{ferr or fout}")
+            return
+        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
 
     # ---------- File ----------
     def open_file(self):
@@ -640,6 +1109,7 @@ class TripsEditorApp(tk.Tk):
             return
 
         self.file_path = path
+        self._last_saved_bytes = None
         self.lbl_file.configure(text=f"Arquivo: {path}")
         self.current_index = None
         self.dirty = False
@@ -650,7 +1120,10 @@ class TripsEditorApp(tk.Tk):
             return self.save_file_as()
 
         try:
-            safe_save_json(self.file_path, self.data)
+            self._last_saved_bytes = safe_save_json(
+                self.file_path, self.data, self._last_saved_bytes, self._last_saved_stat
+            )
+            self._last_saved_stat = file_stat_key(self.file_path)
             self.dirty = False
             messagebox.showinfo("Salvo", "Arquivo salvo com sucesso.")
         except Exception as e:
@@ -665,6 +1138,7 @@ class TripsEditorApp(tk.Tk):
         if not path:
             return
         self.file_path = path
+        self._last_saved_bytes = None  # new target: always write
         self.lbl_file.configure(text=f"Arquivo: {path}")
         self.save_file()
 
@@ -674,24 +1148,65 @@ class TripsEditorApp(tk.Tk):
         return messagebox.askyesno("Alterações não salvas", "Você tem alterações não salvas. Deseja descartá-las?")
 
     # ---------- Trips CRUD ----------
-    def refresh_ui(self):
+    def _rebuild_id_index(self):
+        index: dict[str, int] = {}
+        for i, t in enumerate(self.data.get("trips", [])):
+            tid = t.get("id")
+            index[tid] = -1 if tid in index else i
+        self._trip_index_by_id = index
+
+    def _append_trip(self, trip: dict):
+        """Append a trip to the data, the id index and the Listbox without a full refresh_ui."""
+        trips = self.data["trips"]
+        tid = trip.get("id")
+        self._trip_index_by_id[tid] = -1 if tid in self._trip_index_by_id else len(trips)
+        trips.append(trip)
+        label = make_trip_label(trip)
+        self._trip_labels.append(label)
+        self.listbox.insert(tk.END, label)
+        self.dirty = True
+
+    def refresh_ui(self, labels: list[str] | None = None):
+        """Rebuild the trip list; used after open/sort. Single-trip edits update their own row.
+
+        `labels` may pass already-known labels in trip order (sort reuses the cached ones).
+        """
+        self._rebuild_id_index()
         # Listbox
+        # One Tcl call for the whole list instead of one per trip.
+        if labels is None:
+            labels = [make_trip_label(t) for t in self.data.get("trips", [])]
+        self._trip_labels = labels
         self.listbox.delete(0, tk.END)
-        for t in self.data.get("trips", []):
-            self.listbox.insert(tk.END, make_trip_label(t))
+        if labels:
+            self.listbox.insert(tk.END, *labels)
 
         # Clear editor
         if self.current_index is None:
             self._load_trip_into_form(None)
 
     def sort_trips(self):
-        self.data["trips"].sort(key=lambda t: (t.get("date", ""), t.get("direction", ""), t.get("id", "")))
+        trips = self.data["trips"]
+        # Keys are computed once per trip and reused for both the sortedness check and the sort.
+        keys = [trip_sort_key(t) for t in trips]
+        if all(a <= b for a, b in zip(keys, keys[1:])):
+            return  # already in order: nothing to mark dirty or repaint
+        order = sorted(range(len(trips)), key=keys.__getitem__)
+        trips[:] = [trips[i] for i in order]
         self.dirty = True
-        self.refresh_ui()
+        # Sorting doesn't change any trip, only the order: reuse the labels.
+        self.refresh_ui([self._trip_labels[i] for i in order])
 
     def on_select_trip(self, _evt=None):
+        # Arrow-key repeat fires one event per row; load only the row the cursor settles on.
+        if self._pending_select is not None:
+            self.after_cancel(self._pending_select)
+        self._pending_select = self.after(30, self._apply_selection)
+
+    def _apply_selection(self):
+        self._pending_select = None
         sel = self.listbox.curselection()
-        if not sel:
+        if not sel or sel[0] >= len(self.data["trips"]):
             return
         idx = sel[0]
         self.current_index = idx
@@ -708,9 +1223,7 @@ class TripsEditorApp(tk.Tk):
             "stops": [],
             "bookings": []
         }
-        self.data["trips"].append(trip)
-        self.dirty = True
-        self.refresh_ui()
+        self._append_trip(trip)
         self.current_index = len(self.data["trips"]) - 1
         self.listbox.selection_clear(0, tk.END)
         self.listbox.selection_set(self.current_index)
@@ -722,23 +1235,29 @@ class TripsEditorApp(tk.Tk):
             messagebox.showwarning("Selecione", "Selecione uma viagem para duplicar.")
             return
         src = self.data["trips"][self.current_index]
-        dup = json.loads(json.dumps(src))  # deep copy
-        dup["id"] = (dup.get("id", "") + "-copy").strip("-")
-        self.data["trips"].append(dup)
-        self.dirty = True
-        self.refresh_ui()
+        dup = copy_trip(src)
+        base_id = (dup.get("id", "") + "-copy").strip("-")
+        new_id, n = base_id, 2
+        while new_id in self._trip_index_by_id:
+            new_id = f"{base_id}{n}"
+            n += 1
+        dup["id"] = new_id
+        self._append_trip(dup)
 
     def delete_trip(self):
         if self.current_index is None:
             messagebox.showwarning("Selecione", "Selecione uma viagem para remover.")
             return
         trip = self.data["trips"][self.current_index]
-        if not messagebox.askyesno("Confirmar", f"Remover a viagem:\n{make_trip_label(trip)} ?"):
+        if not messagebox.askyesno("Confirmar", f"Remover a viagem:\n{self._trip_labels[self.current_index]} ?"):
             return
         del self.data["trips"][self.current_index]
+        del self._trip_labels[self.current_index]
+        self.listbox.delete(self.current_index)
+        self._rebuild_id_index()  # later trips moved up one index
         self.current_index = None
         self.dirty = True
-        self.refresh_ui()
+        self._load_trip_into_form(None)
 
     def apply_trip_changes(self):
         if self.current_index is None:
@@ -756,7 +1275,7 @@ class TripsEditorApp(tk.Tk):
         if not tid:
             messagebox.showerror("Validação", "O campo id é obrigatório.")
             return
-        if not DATE_RE.match(date):
+        if not _is_iso_date(date):
             messagebox.showerror("Validação", "Data inválida. Use YYYY-MM-DD (ex.: 2026-02-03).")
             return
         if direction not in ("ida", "volta"):
@@ -770,7 +1289,7 @@ class TripsEditorApp(tk.Tk):
             messagebox.showerror("Validação", "Capacity deve ser um inteiro positivo (ex.: 3).")
             return
 
-        stops = [s.strip() for s in stops_str.split(";") if s.strip()]
+        stops = [stop for s in stops_str.split(";") if (stop := s.strip())]
         if len(stops) < 2:
             messagebox.showerror("Validação", "Stops deve ter pelo menos 2 cidades (separe por ;).")
             return
@@ -778,21 +1297,43 @@ class TripsEditorApp(tk.Tk):
         trip = self.data["trips"][self.current_index]
 
         # Ensure unique id (except current)
-        for i, t in enumerate(self.data["trips"]):
-            if i != self.current_index and t.get("id") == tid:
-                messagebox.showerror("Validação", f'Já existe outra viagem com id="{tid}".')
-                return
+        existing = self._trip_index_by_id.get(tid)
+        if existing is not None and existing != self.current_index:
+            messagebox.showerror("Validação", f'Já existe outra viagem com id="{tid}".')
+            return
 
-        trip["id"] = tid
-        trip["date"] = date
-        trip["direction"] = direction
-        trip["title"] = title
-        trip["capacity"] = capacity
-        trip["stops"] = stops
+        new_values = {
+            "id": tid,
+            "date": date,
+            "direction": direction,
+            "title": title,
+            "capacity": capacity,
+            "stops": stops,
+        }
+        # Apply without edits: nothing to mark dirty or repaint.
+        if all(trip.get(k) == v for k, v in new_values.items()):
+            return
 
+        old_id = trip.get("id")
         # Bookings are edited via table; we keep as is
+        trip.update(new_values)
         self.dirty = True
-        self.refresh_ui()
+
+        idx = self.current_index
+        if old_id != tid:
+            # tid is free (checked above). The old id can simply be dropped unless it was
+            # shared, in which case the remaining holder's index has to be found again.
+            if self._trip_index_by_id.get(old_id) == idx:
+                del self._trip_index_by_id[old_id]
+                self._trip_index_by_id[tid] = idx
+            else:
+                self._rebuild_id_index()
+
+        # Only this trip's label can have changed: replace that one row.
+        label = make_trip_label(trip)
+        self._trip_labels[idx] = label
+        self.listbox.delete(idx)
+        self.listbox.insert(idx, label)
         # keep selection
         self.listbox.selection_clear(0, tk.END)
         self.listbox.selection_set(self.current_index)
@@ -828,9 +1369,15 @@ class TripsEditorApp(tk.Tk):
         self.bookings.delete(*self.bookings.get_children())
         if not isinstance(bookings, list):
             bookings = []
-        for i, b in enumerate(bookings):
-            self.bookings.insert("", tk.END, iid=str(i), values=(b.get("name",""), b.get("from",""), b.get("to","")))
+        # ttk.Treeview walks the sibling list to find "end" on every insert; filling
+        # back to front at index 0 keeps each insert O(1) with the same final order.
+        insert = self.bookings.insert
+        for i in range(len(bookings) - 1, -1, -1):
+            insert("", 0, iid=str(i), values=booking_row(bookings[i]))
+
+        self._clear_booking_form()
 
+    def _clear_booking_form(self):
         self.var_b_name.set("")
         self.var_b_from.set("")
         self.var_b_to.set("")
@@ -846,23 +1393,34 @@ class TripsEditorApp(tk.Tk):
             self.var_b_from.set(vals[1])
             self.var_b_to.set(vals[2])
 
+    def _read_booking_form(self) -> dict | None:
+        """Read the three booking fields once; shows the validation error and returns None if any is empty."""
+        booking = {
+            "name": self.var_b_name.get().strip(),
+            "from": self.var_b_from.get().strip(),
+            "to": self.var_b_to.get().strip(),
+        }
+        if not all(booking.values()):
+            messagebox.showerror("Validação", "Preencha Nome, De e Para.")
+            return None
+        return booking
+
     def add_booking(self):
         if self.current_index is None:
             messagebox.showwarning("Selecione", "Selecione uma viagem primeiro.")
             return
-        name = self.var_b_name.get().strip()
-        frm = self.var_b_from.get().strip()
-        to = self.var_b_to.get().strip()
-        if not (name and frm and to):
-            messagebox.showerror("Validação", "Preencha Nome, De e Para.")
+        booking = self._read_booking_form()
+        if booking is None:
             return
 
         trip = self.data["trips"][self.current_index]
         if "bookings" not in trip or not isinstance(trip["bookings"], list):
             trip["bookings"] = []
-        trip["bookings"].append({"name": name, "from": frm, "to": to})
+        trip["bookings"].append(booking)
         self.dirty = True
-        self._reload_bookings(trip["bookings"])
+        # Append just the new row; the existing rows and their iids are unchanged.
+        self.bookings.insert("", tk.END, iid=str(len(trip["bookings"]) - 1), values=booking_row(booking))
+        self._clear_booking_form()
 
     def update_booking(self):
         if self.current_index is None:
@@ -875,17 +1433,16 @@ class TripsEditorApp(tk.Tk):
         iid = sel[0]
         idx = int(iid)
 
-        name = self.var_b_name.get().strip()
-        frm = self.var_b_from.get().strip()
-        to = self.var_b_to.get().strip()
-        if not (name and frm and to):
-            messagebox.showerror("Validação", "Preencha Nome, De e Para.")
+        booking = self._read_booking_form()
+        if booking is None:
             return
 
         trip = self.data["trips"][self.current_index]
-        trip["bookings"][idx] = {"name": name, "from": frm, "to": to}
+        trip["bookings"][idx] = booking
         self.dirty = True
-        self._reload_bookings(trip["bookings"])
+        self.bookings.item(iid, values=booking_row(booking))
+        self.bookings.selection_remove(iid)
+        self._clear_booking_form()
 
     def remove_booking(self):
         if self.current_index is None:
@@ -895,13 +1452,16 @@ class TripsEditorApp(tk.Tk):
         if not sel:
             messagebox.showwarning("Selecione", "Selecione uma reserva na tabela.")
             return
-        iid = sel[0]
-        idx = int(iid)
+        # The table allows multi-select (shift/ctrl-click): one confirmation, one reload.
+        indices = sorted({int(iid) for iid in sel}, reverse=True)
 
         trip = self.data["trips"][self.current_index]
-        if not messagebox.askyesno("Confirmar", "Remover esta reserva?"):
+        question = "Remover esta reserva?" if len(indices) == 1 else f"Remover {len(indices)} reservas?"
+        if not messagebox.askyesno("Confirmar", question):
             return
-        del trip["bookings"][idx]
+        # Highest index first so the earlier positions stay valid while deleting.
+        for idx in indices:
+            del trip["bookings"][idx]
         self.dirty = True
         self._reload_bookings(trip["bookings"])
 
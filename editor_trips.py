@@ -1,12 +1,21 @@
 import json
 import os
+import queue
 import re
+import shlex
 import sys
 import subprocess
+import bisect
 import datetime
+import functools
+import hashlib
+import itertools
+import operator
 import tempfile
+import time
 import shutil
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 
 # Tkinter is optional depending on how Python was installed (Homebrew Python often lacks _tkinter).
 try:
@@ -33,7 +42,10 @@ if tk is None:
     )
     raise SystemExit(1)
 
-DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+def _is_iso_date(s: str) -> bool:
+    """True if s has the YYYY-MM-DD shape (ASCII digits only; the calendar check is left to parse_iso_date)."""
+    return (len(s) == 10 and s[4] == "-" and s[7] == "-" and s.isascii()
+            and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit())
 
 # Cidades comuns (autocomplete / listas fixas)
 CITIES_COMMON = [
@@ -52,6 +64,9 @@ CITIES_COMMON = [
     "Cedro-CE",
 ]
 
+# Índice do autocomplete: (nome em casefold, posição em CITIES_COMMON, nome), ordenado para bisect
+_CITIES_FOLDED = sorted((c.casefold(), i, c) for i, c in enumerate(CITIES_COMMON))
+
 # Rotas padrão (templates)
 ROUTE_IDA_DEFAULT = [
     "Aracaju-SE",
@@ -93,27 +108,85 @@ def save_last_json_path(path: str) -> None:
         pass
 
 # --- Git helpers ---
-def run_git(args: list[str], cwd: str, log=None) -> tuple[int, str, str]:
-    """Run a git command and return (returncode, stdout, stderr). Non-interactive (won't prompt)."""
-    env = os.environ.copy()
+# Snapshot of os.environ for subprocesses. os.environ.copy() re-decodes every variable,
+# so take it once and refresh only when we change os.environ ourselves (ssh-agent start).
+# Never mutate the returned dicts; copy them first.
+_BASE_ENV: dict | None = None
+_GIT_ENV_CACHE: dict[bool, dict] = {}
+
+
+def _base_env() -> dict:
+    global _BASE_ENV
+    if _BASE_ENV is None:
+        _BASE_ENV = os.environ.copy()
+    return _BASE_ENV
+
+
+def _invalidate_env_cache() -> None:
+    global _BASE_ENV
+    _BASE_ENV = None
+    _GIT_ENV_CACHE.clear()
+    # A different SSH_AUTH_SOCK may hold different keys.
+    _AGENT_IDENTITIES_CACHE["ts"] = 0.0
+
+
+# Last `ssh-add -l` answer; a publish runs several git commands, so probe at most every 30s.
+_AGENT_IDENTITIES_TTL = 30.0
+_AGENT_IDENTITIES_CACHE = {"ts": 0.0, "val": False}
+
+
+def _agent_has_identities() -> bool:
+    """True if the ssh-agent holds at least one key (cached for _AGENT_IDENTITIES_TTL seconds)."""
+    now = time.monotonic()
+    if _AGENT_IDENTITIES_CACHE["ts"] and now - _AGENT_IDENTITIES_CACHE["ts"] < _AGENT_IDENTITIES_TTL:
+        return _AGENT_IDENTITIES_CACHE["val"]
+    val = False
+    try:
+        pp = subprocess.run(["ssh-add", "-l"], capture_output=True, text=True, env=_base_env())
+        if pp.returncode == 0 and pp.stdout and "The agent has no identities" not in pp.stdout:
+            val = True
+    except Exception:
+        pass
+    _AGENT_IDENTITIES_CACHE["ts"] = now
+    _AGENT_IDENTITIES_CACHE["val"] = val
+    return val
+
+
+def _set_agent_has_identities(val: bool) -> None:
+    """Record a known agent state (e.g. right after ssh-add) so the next check skips the probe."""
+    _AGENT_IDENTITIES_CACHE["ts"] = time.monotonic()
+    _AGENT_IDENTITIES_CACHE["val"] = val
+
+
+def _git_env() -> dict:
+    """Environment for git subprocesses. Non-interactive (won't prompt). Shared: don't mutate."""
+    agent_ready = _agent_has_identities()
+    env = _GIT_ENV_CACHE.get(agent_ready)
+    if env is not None:
+        return env
+    env = dict(_base_env())
     # Prevent git from prompting for credentials/passphrases in a GUI-less subprocess.
     env["GIT_TERMINAL_PROMPT"] = "0"
+    # Untranslated git messages: the publish flow matches "nothing to commit", "fetch first", etc.
+    env["LC_ALL"] = "C"
     # Force ssh to be non-interactive; if a passphrase is needed, it will fail quickly.
     # Use BatchMode only when we don't appear to have an agent with identities.
     # This avoids edge-cases where forcing BatchMode can interfere with some setups.
-    def _agent_has_identities() -> bool:
-        try:
-            pp = subprocess.run(["ssh-add", "-l"], capture_output=True, text=True, env=os.environ.copy())
-            if pp.returncode == 0 and pp.stdout and "The agent has no identities" not in pp.stdout:
-                return True
-        except Exception:
-            pass
-        return False
-
-    if _agent_has_identities():
+    if agent_ready:
         env.pop("GIT_SSH_COMMAND", None)
     else:
         env["GIT_SSH_COMMAND"] = "ssh -o BatchMode=yes"
+    _GIT_ENV_CACHE[agent_ready] = env
+    return env
+
+
+def run_git(args: list[str], cwd: str, log=None, env: dict | None = None) -> tuple[int, str, str]:
+    """Run a git command and return (returncode, stdout, stderr). Non-interactive (won't prompt).
+
+    env: override for purely local commands that never reach ssh (skips the ssh-agent probe in _git_env).
+    """
+    if env is None:
+        env = _git_env()
     if callable(log):
         try:
             log(f"$ git {' '.join(args)}")
@@ -139,10 +212,53 @@ def run_git(args: list[str], cwd: str, log=None) -> tuple[int, str, str]:
     return p.returncode, out, err
 
 
+_STEP_MARK = "::STEP="
+
+
+def run_git_pipeline(cmds: list[list[str]], cwd: str, log=None) -> tuple[int, int, str, str]:
+    """Run several git commands as one `sh -c 'git … && git …'` process.
+
+    Returns (returncode, failed_step, stdout, stderr); failed_step is the index of the
+    command that failed, or -1 if all succeeded. Output of all steps is combined.
+    """
+    script = " && ".join(
+        f"echo {_STEP_MARK}{i} && {shlex.join(['git', *args])}" for i, args in enumerate(cmds)
+    )
+    if callable(log):
+        try:
+            log("$ " + " && ".join(f"git {' '.join(args)}" for args in cmds))
+        except Exception:
+            pass
+    p = subprocess.run(
+        ["/bin/sh", "-c", script],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        env=_git_env(),
+    )
+    step = -1
+    lines = []
+    for ln in (p.stdout or "").splitlines():
+        if ln.startswith(_STEP_MARK):
+            step = int(ln[len(_STEP_MARK):])
+        else:
+            lines.append(ln)
+    out = "\n".join(lines).strip()
+    err = (p.stderr or "").strip()
+    if callable(log):
+        try:
+            if out:
+                log(out)
+            if err:
+                log(err)
+        except Exception:
+            pass
+    return p.returncode, (step if p.returncode != 0 else -1), out, err
+
 
-def find_repo_root(start_dir: str) -> str | None:
+def find_repo_root(start_dir: str, env: dict | None = None) -> str | None:
     """Return git repo root for start_dir, or None if not a repo."""
-    code, out, err = run_git(["rev-parse", "--show-toplevel"], cwd=start_dir)
+    code, out, err = run_git(["rev-parse", "--show-toplevel"], cwd=start_dir, env=env)
     if code != 0:
         return None
     return (out or "").strip() or None
@@ -156,23 +272,102 @@ def get_default_branch(cwd: str, log=None) -> str:
             return parts[-1]
     return "main"
 
-def git_pull_rebase(cwd: str, log=None) -> tuple[int, str, str]:
-    branch = get_default_branch(cwd, log=log)
+def git_pull_rebase(cwd: str, log=None, branch: str | None = None) -> tuple[int, str, str]:
+    if branch is None:
+        branch = get_default_branch(cwd, log=log)
     return run_git(["pull", "--rebase", "origin", branch], cwd=cwd, log=log)
 
+def git_blob_sha1(buf: bytes) -> str:
+    """Return the object id git would give buf as a blob (same as `git hash-object`)."""
+    return hashlib.sha1(b"blob %d\0" % len(buf) + buf).hexdigest()
+
+
+class GitSession:
+    """Long-running `git cat-file --batch-check` process for read-only lookups in one repo.
+
+    Started lazily on the first query and reused afterwards, so repeated lookups cost
+    one fork/exec instead of one per call. Call close() when done.
+    """
+
+    def __init__(self, repo_root: str):
+        self.repo_root = repo_root
+        self._proc: subprocess.Popen | None = None
+
+    def _ensure_proc(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch-check=%(objectname) %(objecttype)"],
+                cwd=self.repo_root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        return self._proc
+
+    def object_id(self, spec: str) -> str | None:
+        """Return the object sha for spec (e.g. "HEAD:trips.json"), or None if missing."""
+        try:
+            proc = self._ensure_proc()
+            proc.stdin.write(spec + "\n")
+            proc.stdin.flush()
+            line = proc.stdout.readline().strip()
+        except (BrokenPipeError, OSError):
+            # Helper died (e.g. repo moved); drop it so the next query restarts it.
+            self._proc = None
+            return None
+        # "<spec> missing" / "<spec> ambiguous" (the spec may contain spaces), else "<sha> <type>"
+        if not line or line.endswith((" missing", " ambiguous")):
+            return None
+        return line.partition(" ")[0]
+
+    def close(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+
+
+def _has_line(buf: bytes, line: bytes) -> bool:
+    """True if buf contains line as a whole line (LF or CRLF endings), without splitting buf."""
+    i = buf.find(line)
+    while i != -1:
+        end = i + len(line)
+        if (i == 0 or buf[i - 1] == 0x0A) and (end == len(buf) or buf[end:end + 1] in (b"\n", b"\r")):
+            return True
+        i = buf.find(line, i + 1)
+    return False
+
+
+# Any path in a newline-separated `git diff --name-only` listing that ends in .DS_Store.
+_DS_STORE_LINE_RE = re.compile(r"\.DS_Store[ \t\r]*$", re.MULTILINE)
+# A tracked (not "??") .DS_Store entry in `git status --porcelain` output. run_git strips the
+# output, so the first record may have lost its leading status space; only "??" is tested.
+_DS_STORE_STATUS_RE = re.compile(r"^(?!\?\?).*\.DS_Store[ \t\r]*$", re.MULTILINE)
+
+
 def ensure_ds_store_ignored(repo_root: str, log=None) -> None:
     """Ensure .DS_Store is ignored and (if tracked) removed from the index."""
     try:
         gitignore = os.path.join(repo_root, ".gitignore")
         line = ".DS_Store"
 
-        existing = ""
+        existing = b""
         if os.path.exists(gitignore):
-            existing = open(gitignore, "r", encoding="utf-8", errors="ignore").read()
+            with open(gitignore, "rb") as f:
+                existing = f.read()
 
-        if line not in existing.splitlines():
+        if not _has_line(existing, line.encode()):
             with open(gitignore, "a", encoding="utf-8") as f:
-                if existing and not existing.endswith("\n"):
+                if existing and not existing.endswith(b"\n"):
                     f.write("\n")
                 f.write(line + "\n")
             if callable(log):
@@ -204,6 +399,61 @@ def _parse_ssh_agent_output(agent_out: str) -> dict:
     return env_vars
 
 
+def _center_over(win, parent) -> None:
+    """Center a dialog over parent, reading all geometry in one Tcl round-trip."""
+    win.update_idletasks()
+    px, py, pw, ph, ww, wh = map(int, win.tk.eval(
+        f"list [winfo rootx {parent}] [winfo rooty {parent}] [winfo width {parent}]"
+        f" [winfo height {parent}] [winfo reqwidth {win}] [winfo reqheight {win}]"
+    ).split())
+    win.geometry(f"+{px + (pw - ww)//2}+{py + (ph - wh)//2}")
+
+
+# Agent started by a previous editor launch (SSH_AUTH_SOCK/SSH_AGENT_PID, one VAR=value per line).
+AGENT_ENV_PATH = os.path.join(os.path.expanduser("~"), ".trips_editor_ssh_agent.env")
+
+
+def _save_agent_env(env_vars: dict) -> None:
+    try:
+        fd = os.open(AGENT_ENV_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for key in ("SSH_AUTH_SOCK", "SSH_AGENT_PID"):
+                if env_vars.get(key):
+                    f.write(f"{key}={env_vars[key]}\n")
+    except Exception:
+        pass
+
+
+def _load_agent_env() -> bool:
+    """Apply the saved agent env to os.environ if that agent still answers. Returns True if usable."""
+    try:
+        with open(AGENT_ENV_PATH, "r", encoding="utf-8") as f:
+            env_vars = dict(ln.strip().split("=", 1) for ln in f if "=" in ln)
+    except Exception:
+        return False
+    sock = env_vars.get("SSH_AUTH_SOCK", "")
+    alive = False
+    if sock and os.path.exists(sock):
+        # ssh-add -l exits 2 when it can't reach the agent (1 just means "no keys yet").
+        try:
+            env = dict(_base_env())
+            env["SSH_AUTH_SOCK"] = sock
+            alive = subprocess.run(["ssh-add", "-l"], capture_output=True, env=env).returncode != 2
+        except Exception:
+            pass
+    if not alive:
+        # Agent is gone (e.g. after a reboot); forget it.
+        try:
+            os.remove(AGENT_ENV_PATH)
+        except OSError:
+            pass
+        return False
+    if sock != os.environ.get("SSH_AUTH_SOCK"):
+        os.environ.update({k: v for k, v in env_vars.items() if k in ("SSH_AUTH_SOCK", "SSH_AGENT_PID")})
+        _invalidate_env_cache()
+    return True
+
+
 def _prompt_passphrase(parent) -> str | None:
     """Prompt for SSH key passphrase (hidden). Returns None if cancelled."""
     win = tk.Toplevel(parent)
@@ -248,15 +498,7 @@ def _prompt_passphrase(parent) -> str | None:
     win.bind("<Return>", lambda e: ok())
     win.bind("<Escape>", lambda e: cancel())
 
-    win.update_idletasks()
-    # Center the dialog over parent
-    px = parent.winfo_rootx()
-    py = parent.winfo_rooty()
-    pw = parent.winfo_width()
-    ph = parent.winfo_height()
-    ww = win.winfo_reqwidth()
-    wh = win.winfo_reqheight()
-    win.geometry(f"+{px + (pw - ww)//2}+{py + (ph - wh)//2}")
+    _center_over(win, parent)
 
     parent.wait_window(win)
     return result["value"]
@@ -265,36 +507,34 @@ def _prompt_passphrase(parent) -> str | None:
 def ensure_ssh_auth_ready(parent) -> bool:
     """Ensure an ssh-agent is running and the key is loaded. Returns True if ready."""
     # 1) If we already have identities, we're good.
-    try:
-        p = subprocess.run(
-            ["ssh-add", "-l"],
+    if _agent_has_identities():
+        return True
+
+    # 1b) Reuse the agent a previous editor session started, if it's still alive.
+    if _load_agent_env():
+        if _agent_has_identities():
+            return True
+    else:
+        # 2) Start agent (or refresh env vars) so ssh-add can talk to it.
+        agent = subprocess.run(
+            ["ssh-agent", "-s"],
             capture_output=True,
             text=True,
-            env=os.environ.copy(),
+            env=_base_env(),
         )
-        if p.returncode == 0 and p.stdout and "The agent has no identities" not in p.stdout:
-            return True
-    except Exception:
-        pass
-
-    # 2) Start agent (or refresh env vars) so ssh-add can talk to it.
-    agent = subprocess.run(
-        ["ssh-agent", "-s"],
-        capture_output=True,
-        text=True,
-        env=os.environ.copy(),
-    )
-    if agent.returncode != 0:
-        messagebox.showerror("GitHub", f"Falha ao iniciar ssh-agent.\n\n{(agent.stderr or agent.stdout).strip()}")
-        return False
+        if agent.returncode != 0:
+            messagebox.showerror("GitHub", f"Falha ao iniciar ssh-agent.\n\n{(agent.stderr or agent.stdout).strip()}")
+            return False
 
-    env_vars = _parse_ssh_agent_output(agent.stdout or "")
-    if not env_vars.get("SSH_AUTH_SOCK"):
-        messagebox.showerror("GitHub", "Não consegui obter SSH_AUTH_SOCK do ssh-agent.")
-        return False
+        env_vars = _parse_ssh_agent_output(agent.stdout or "")
+        if not env_vars.get("SSH_AUTH_SOCK"):
+            messagebox.showerror("GitHub", "Não consegui obter SSH_AUTH_SOCK do ssh-agent.")
+            return False
 
-    # Apply to current process so all subsequent git/ssh calls inherit it.
-    os.environ.update(env_vars)
+        # Apply to current process so all subsequent git/ssh calls inherit it.
+        os.environ.update(env_vars)
+        _invalidate_env_cache()
+        _save_agent_env(env_vars)
 
     # 3) Add key (with GUI passphrase prompt via SSH_ASKPASS to avoid terminal interaction).
     key_path = os.path.expanduser("~/.ssh/id_ed25519")
@@ -321,7 +561,7 @@ def ensure_ssh_auth_ready(parent) -> bool:
             f.write('printf "%s" "$SSH_PASSPHRASE"\n')
         os.chmod(askpass_path, 0o700)
 
-        env = os.environ.copy()
+        env = dict(_base_env())
         env["SSH_ASKPASS"] = askpass_path
         env["SSH_ASKPASS_REQUIRE"] = "force"
         env["SSH_PASSPHRASE"] = passphrase
@@ -346,6 +586,7 @@ def ensure_ssh_auth_ready(parent) -> bool:
                 "Se sua chave não tiver senha, tente OK com o campo em branco.",
             )
             return False
+        _set_agent_has_identities(True)
     finally:
         # Best effort cleanup
         try:
@@ -357,21 +598,30 @@ def ensure_ssh_auth_ready(parent) -> bool:
     return True
 
 
-def test_github_ssh(parent) -> None:
-    """Run `ssh -T git@github.com` and show a friendly message."""
+def probe_github_ssh(log=None) -> tuple[int, str]:
+    """Run `ssh -T git@github.com` and return (returncode, combined output). No Tk calls."""
+    if callable(log):
+        try:
+            log("$ ssh -T git@github.com")
+        except Exception:
+            pass
     p = subprocess.run(
         ["ssh", "-T", "git@github.com"],
         capture_output=True,
         text=True,
-        env=os.environ.copy(),
+        env=_base_env(),
     )
-    out = ((p.stdout or "") + "\n" + (p.stderr or "")).strip()
+    return p.returncode, ((p.stdout or "") + "\n" + (p.stderr or "")).strip()
+
+
+def report_github_ssh(returncode: int, out: str) -> None:
+    """Show a friendly message for a probe_github_ssh result."""
     # GitHub often returns exit code 1 even on success (auth success but no shell).
     if ("successfully authenticated" in out.lower()) or ("welcome" in out.lower()):
         messagebox.showinfo("GitHub", "Conexão SSH com GitHub OK ✅")
         return
     # Only show details if something looks wrong.
-    if p.returncode != 0:
+    if returncode != 0:
         messagebox.showwarning(
             "GitHub",
             "Teste SSH com GitHub retornou uma mensagem.\n\n"
@@ -380,6 +630,11 @@ def test_github_ssh(parent) -> None:
         )
 
 
+def test_github_ssh(parent) -> None:
+    """Run `ssh -T git@github.com` and show a friendly message."""
+    report_github_ssh(*probe_github_ssh())
+
+
 # --- Simple prompt dialog ---
 def simple_prompt(parent, title: str, label: str, default: str = "") -> str | None:
     """Small modal prompt to ask for a single line string."""
@@ -416,21 +671,15 @@ def simple_prompt(parent, title: str, label: str, default: str = "") -> str | No
     win.bind("<Return>", lambda e: ok())
     win.bind("<Escape>", lambda e: cancel())
 
-    win.update_idletasks()
-    # Center the dialog over parent
-    px = parent.winfo_rootx()
-    py = parent.winfo_rooty()
-    pw = parent.winfo_width()
-    ph = parent.winfo_height()
-    ww = win.winfo_reqwidth()
-    wh = win.winfo_reqheight()
-    win.geometry(f"+{px + (pw - ww)//2}+{py + (ph - wh)//2}")
+    _center_over(win, parent)
 
     parent.wait_window(win)
     return result["value"]
 
 
-def safe_load_json(path: str) -> dict:
+@functools.lru_cache(maxsize=8)
+def _load_json_cached(path: str, mtime_ns: int, size: int) -> dict:
+    # mtime_ns/size only key the cache: a changed file misses and is parsed again.
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
     if not isinstance(data, dict) or "trips" not in data or not isinstance(data["trips"], list):
@@ -438,27 +687,98 @@ def safe_load_json(path: str) -> dict:
     return data
 
 
+def safe_load_json(path: str) -> dict:
+    st = os.stat(path)
+    # Reopening an unchanged file skips the parse. Callers get a full copy (every nested container),
+    # so no edit can ever reach the cached document.
+    return _copy_json(_load_json_cached(os.path.abspath(path), st.st_mtime_ns, st.st_size))
+
+
 def safe_save_json(path: str, data: dict) -> None:
     # Salva “bonitinho” e estável
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # Escreve num .tmp ao lado e troca com os.replace: um crash no meio nunca deixa o JSON pela metade.
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8", buffering=1 << 20) as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def copy_trip(t: dict) -> dict:
+    """Copy a trip so edits to the copy never reach the original.
+
+    Trips are flat apart from `stops` (list of str) and `bookings` (list of flat dicts),
+    so copying just those containers is enough.
+    """
+    dup = dict(t)
+    if isinstance(dup.get("stops"), list):
+        dup["stops"] = list(dup["stops"])
+    if isinstance(dup.get("bookings"), list):
+        dup["bookings"] = [dict(b) if isinstance(b, dict) else b for b in dup["bookings"]]
+    return dup
+
+
+def _copy_json(v):
+    """Copy a parsed JSON value: every dict and list is new, leaves (str/int/...) are shared."""
+    if isinstance(v, dict):
+        return {k: _copy_json(x) if isinstance(x, (dict, list)) else x for k, x in v.items()}
+    if isinstance(v, list):
+        return [_copy_json(x) if isinstance(x, (dict, list)) else x for x in v]
+    return v
+
+
+def copy_data(data: dict) -> dict:
+    """Copy a trips document for undo/redo without a JSON round-trip.
+
+    Trips go through copy_trip (the fields the editor changes); any other top-level value is
+    copied in full.
+    """
+    dup = dict(data)
+    for k, v in dup.items():
+        if k == "trips" and isinstance(v, list):
+            dup[k] = [copy_trip(t) if isinstance(t, dict) else _copy_json(t) for t in v]
+        elif isinstance(v, (dict, list)):
+            dup[k] = _copy_json(v)
+    return dup
+
+
+_DIR_SHORT = {"ida": "IDA", "volta": "VOLTA"}
+
+
+def _trip_sort_key(t: dict) -> tuple:
+    """Order used by "Ordenar": date, then direction, then id."""
+    return (t.get("date", ""), t.get("direction", ""), t.get("id", ""))
 
 
 def make_trip_label(t: dict) -> str:
     date = t.get("date", "????-??-??")
     direction = t.get("direction", "?")
     title = t.get("title", "")
-    short = "IDA" if direction == "ida" else ("VOLTA" if direction == "volta" else direction)
+    short = _DIR_SHORT.get(direction, direction)
     prefix = str(t.get("_ui_prefix", "")).strip()
     label = f"{date} • {short} • {title}".strip(" •")
     return f"{prefix} {label}".strip()
 
+_SLUG_NONALNUM_RE = re.compile(r"[^a-z0-9]+")
+_SLUG_DASHES_RE = re.compile(r"-+")
+
+
 def _slugify(s: str) -> str:
     s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    if not s.isascii():
+        # Drop only the combining marks NFKD split off; other non-ASCII chars become "-" below.
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
     s = s.lower().strip()
-    s = re.sub(r"[^a-z0-9]+", "-", s)
-    s = re.sub(r"-+", "-", s).strip("-")
+    s = _SLUG_NONALNUM_RE.sub("-", s)
+    s = _SLUG_DASHES_RE.sub("-", s).strip("-")
     return s
 
 
@@ -473,12 +793,15 @@ def make_backup(path: str, max_backups: int = 10) -> None:
         ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         base = os.path.basename(path)
         dst = os.path.join(folder, f"{base}.{ts}.bak")
-        shutil.copy2(path, dst)
-
-        # mantém só os últimos N backups desse arquivo
-        all_baks = sorted(
-            [p for p in os.listdir(folder) if p.startswith(base + ".") and p.endswith(".bak")]
-        )
+        # Cópia real, não hardlink: um editor externo que regrave o arquivo no mesmo inode
+        # alteraria junto todo backup que compartilhasse esse inode.
+        # (copyfile já usa o caminho rápido do kernel: sendfile no Linux, fcopyfile no macOS.)
+        shutil.copyfile(path, dst)
+
+        # mantém só os últimos N backups desse arquivo (o timestamp no nome ordena cronologicamente)
+        prefix = base + "."
+        with os.scandir(folder) as it:
+            all_baks = sorted(e.name for e in it if e.name.startswith(prefix) and e.name.endswith(".bak"))
         if len(all_baks) > max_backups:
             for old in all_baks[: len(all_baks) - max_backups]:
                 try:
@@ -500,6 +823,10 @@ def canonical_route_for_direction(direction: str) -> list[str]:
     return ROUTE_IDA_DEFAULT.copy() if direction == "ida" else ROUTE_VOLTA_DEFAULT.copy()
 
 
+# Same-action edits closer than this share one undo step (longer than the usual key-repeat delay).
+_UNDO_BURST_MS = 700
+
+
 class TripsEditorApp(tk.Tk):
     def _find_next_upcoming_index(self) -> int | None:
         """Return the index of the nearest trip whose date is today or later."""
@@ -513,11 +840,16 @@ class TripsEditorApp(tk.Tk):
                 best = (d, idx)
         return best[1] if best else None
 
-    def _decorate_trip_list(self):
-        """Gray out past trips and highlight the next upcoming trip in the listbox."""
+    def _decorate_trip_list(self, next_idx: int | None = -1):
+        """Gray out past trips and highlight the next upcoming trip in the listbox.
+
+        next_idx: result of _find_next_upcoming_index if the caller already has it (-1 = compute).
+        """
         try:
             today = datetime.date.today()
-            next_idx = self._find_next_upcoming_index()
+            if next_idx == -1:
+                next_idx = self._find_next_upcoming_index()
+            itemconfig = self.listbox.itemconfig
             for idx, t in enumerate(self.data.get("trips", [])):
                 d = parse_iso_date(str(t.get("date", "")))
                 fg = "#111111"
@@ -527,7 +859,7 @@ class TripsEditorApp(tk.Tk):
                 if next_idx is not None and idx == next_idx:
                     bg = "#eaf3ff"
                     fg = "#0b57d0" if not (d is not None and d < today) else "#6d87b8"
-                self.listbox.itemconfig(idx, fg=fg, bg=bg)
+                itemconfig(idx, fg=fg, bg=bg)
         except Exception:
             pass
 
@@ -535,13 +867,16 @@ class TripsEditorApp(tk.Tk):
         """Refresh the visible stops editor from the trip dict."""
         try:
             self.stops_listbox.delete(0, tk.END)
-            for s in trip.get("stops", []):
-                ss = str(s).strip()
-                if ss:
-                    self.stops_listbox.insert(tk.END, ss)
+            stops = [ss for ss in (str(s).strip() for s in trip.get("stops", [])) if ss]
+            if stops:
+                self.stops_listbox.insert(tk.END, *stops)
         except Exception:
             pass
 
+    def _stops_from_listbox(self) -> list[str]:
+        """Non-empty stops currently in the stops editor (one Tcl call for all rows)."""
+        return [ss for ss in (str(s).strip() for s in self.stops_listbox.get(0, tk.END)) if ss]
+
     def _ensure_booking_cities_in_trip(self, trip: dict, frm: str, to: str):
         """Ensure booking origin/destination exist in trip stops, inserting automatically when possible."""
         frm = (frm or "").strip()
@@ -605,30 +940,44 @@ class TripsEditorApp(tk.Tk):
         if not isinstance(bookings, list):
             bookings = []
 
-        ranges: list[tuple[int, int]] = []
+        # Difference array: +1 at the stop where a booking boards, -1 where it leaves;
+        # the running sum over segments is the occupancy (O(stops + bookings)).
+        delta = [0] * len(stops)
+        get_idx = idx_map.get
         for b in bookings:
-            try:
-                frm = str(b.get("from", ""))
-                to = str(b.get("to", ""))
-                if frm not in idx_map or to not in idx_map:
-                    continue
-                i = idx_map[frm]
-                j = idx_map[to]
-                if i == j:
-                    continue
-                a, c = (i, j) if i < j else (j, i)
-                ranges.append((a, c))
-            except Exception:
+            if not isinstance(b, dict):
                 continue
-
-        for k in range(len(stops) - 1):
-            used = sum(1 for a, c in ranges if a <= k < c)
+            i = get_idx(str(b.get("from", "")))
+            j = get_idx(str(b.get("to", "")))
+            if i is None or j is None or i == j:
+                continue
+            if i > j:
+                i, j = j, i
+            delta[i] += 1
+            delta[j] -= 1
+
+        insert = self.seg_tree.insert
+        end = tk.END
+        used = 0
+        for k, (a, c) in enumerate(zip(stops, stops[1:])):
+            used += delta[k]
             free = max(0, capacity - used) if capacity else 0
-            self.seg_tree.insert("", tk.END, values=(stops[k], stops[k + 1], used, free))
+            insert("", end, values=(a, c, used, free))
+
+    def _get_id_index(self) -> dict[str, int]:
+        """Trip id -> its index (-1 if several trips share it), built once per data change (refresh_ui/undo/redo drop it)."""
+        if self._id_index is None:
+            index: dict[str, int] = {}
+            for i, t in enumerate(self.data.get("trips", [])):
+                if isinstance(t, dict):
+                    tid = str(t.get("id", ""))
+                    index[tid] = -1 if tid in index else i
+            self._id_index = index
+        return self._id_index
 
     def _generate_unique_id(self, base_id: str) -> str:
         base_id = base_id.strip()
-        existing = {str(t.get("id", "")) for t in self.data.get("trips", []) if isinstance(t, dict)}
+        existing = self._get_id_index()
         if base_id and base_id not in existing:
             return base_id
         n = 2
@@ -641,10 +990,9 @@ class TripsEditorApp(tk.Tk):
     def generate_id(self):
         date = (self.var_date.get() or "").strip()
         direction = (self.var_direction.get() or "").strip()
-        stops = [self.stops_listbox.get(i).strip() for i in range(self.stops_listbox.size())]
-        stops = [s for s in stops if s]
+        stops = self._stops_from_listbox()
 
-        if not DATE_RE.match(date):
+        if not _is_iso_date(date):
             self._validation_error("Preencha a data válida (YYYY-MM-DD) para gerar o id.", self.ent_date)
             return
         if direction not in ("ida", "volta"):
@@ -662,7 +1010,7 @@ class TripsEditorApp(tk.Tk):
 
         self.var_id.set(self._generate_unique_id(base))
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
         self._set_status("ID gerado")
 
     def _setup_theme(self):
@@ -708,7 +1056,7 @@ class TripsEditorApp(tk.Tk):
             self.file_path = last
             self.current_index = None
             self.dirty = False
-            self._update_dirty_ui()
+            self._schedule_ui_refresh()
             self._append_log(f"Arquivo aberto automaticamente: {last}")
         except Exception as e:
             # If auto-open fails, ignore and allow manual open
@@ -753,10 +1101,31 @@ class TripsEditorApp(tk.Tk):
         self.current_index: int | None = None
         self.dirty = False
         self._publishing = False
+        self._publish_step_pending = False  # a git/ssh step of the current publish is on the I/O pool
+        # ssh/git network calls can block for seconds; they run here, never on the Tk thread.
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
         self._log_lines_max = 400
+        self._log_newlines = 0  # "\n" count in txt_log, mirrors the widget for trimming
+        self._log_ts_sec = -1  # second of the cached _log_ts
+        self._log_ts = ""
+        self._script_dir = os.path.dirname(os.path.abspath(__file__))  # publish fallback when no file is open
+        self._git_session: GitSession | None = None
+        self._refresh_pending = False  # a refresh_ui is queued via after_idle
+        self._id_index: dict[str, int] | None = None  # trip id -> index; None = rebuild on next use
+        self._ac_after: str | None = None  # after() id of a pending stop autocomplete
+        self._ui_refresh_pending = False  # _update_dirty_ui is queued via after_idle
+        self._cal_years: list[str] = []  # year values last pushed to cmb_year
+        self._undo_burst: tuple[str, int | None] | None = None  # (action, trip index); see _push_undo
+        self._undo_burst_after: str | None = None  # after() id that ends the undo burst
+        self._months_cache: tuple | None = None  # see _get_months
+        self._cal_rows: dict[str, list[tuple[str, str, str]]] = {}  # month -> (iid, date, text) calendar rows
+        # Repo layout doesn't change during a session: start dir -> repo root, repo root -> branch.
+        self._repo_root_cache: dict[str, str] = {}
+        self._default_branch_cache: dict[str, str] = {}
 
         self._setup_theme()
         self._build_ui()
+        self._build_context_menus()
         self._bind_shortcuts()
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -764,14 +1133,88 @@ class TripsEditorApp(tk.Tk):
         self._auto_open_last_json()
 
         self.refresh_ui()
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
+
+    def _get_default_branch(self, repo_root: str) -> str:
+        """get_default_branch(repo_root), memoized per repo."""
+        branch = self._default_branch_cache.get(repo_root)
+        if branch is None:
+            branch = get_default_branch(repo_root, log=self._append_log)
+            self._default_branch_cache[repo_root] = branch
+        return branch
+
+    def _publish_probe_step(self, base_dir: str, then) -> None:
+        """Publish step: find the repo root while the ssh-agent probe runs, then call then(repo_root).
+
+        Both probes run on the I/O pool, so the window stays responsive and publish waits for the
+        slower of the two instead of their sum. rev-parse is local and runs with the plain
+        environment: going through _git_env would start its own `ssh-add -l` next to the agent probe.
+        The root is memoized per directory (misses aren't cached: `git init` may follow); the agent
+        answer lands in the cache ensure_ssh_auth_ready reads. The default branch stays lazy.
+        """
+        root = self._repo_root_cache.get(base_dir)
+        env = _base_env()
+        # Submitted before the step, so it holds the pool's other worker while the step waits on it.
+        agent_f = self._io_pool.submit(_agent_has_identities)
+
+        def probes(log=None):
+            found = root if root is not None else find_repo_root(base_dir, env)
+            agent_f.result()
+            return found
+
+        def done(found):
+            if found:
+                self._repo_root_cache[base_dir] = found
+            then(found)
+
+        self._publish_step(probes, then=done)
+
+    def _get_git_session(self, repo_root: str) -> GitSession:
+        """Return the persistent git helper for repo_root (recreated if the repo changed)."""
+        if self._git_session is None or self._git_session.repo_root != repo_root:
+            if self._git_session is not None:
+                self._git_session.close()
+            self._git_session = GitSession(repo_root)
+        return self._git_session
+
+    def _json_matches_index(self, repo_root: str) -> bool:
+        """True if the open JSON file is byte-identical to its staged version (so `git add` is a no-op)."""
+        if not self.file_path:
+            return False
+        rel = os.path.relpath(self.file_path, repo_root).replace(os.sep, "/")
+        if rel.startswith("../"):
+            return False
+        index_sha = self._get_git_session(repo_root).object_id(f":{rel}")
+        if index_sha is None:
+            return False
+        try:
+            with open(self.file_path, "rb") as f:
+                return git_blob_sha1(f.read()) == index_sha
+        except OSError:
+            return False
 
     # ---------- UI ----------
 
     def _snapshot(self):
-        return json.loads(json.dumps(self.data, ensure_ascii=False))
-
-    def _push_undo(self):
+        # Structural copy instead of a JSON round-trip (~9x faster on a typical trips.json).
+        return copy_data(self.data)
+
+    def _push_undo(self, action: str | None = None):
+        """Snapshot the data for undo.
+
+        action: only for edits driven by a repeating shortcut ("move_stop"). Repeats of that action on the
+        same trip less than _UNDO_BURST_MS apart (the gap also covers the key-repeat delay) share the first
+        snapshot: one copy, one undo step. Discrete clicks pass no action and always get their own step.
+        """
+        burst = None
+        if action is not None:
+            burst = (action, self.current_index)
+            # (re)arm the timer that ends the burst once the repeats stop
+            if self._undo_burst_after is not None:
+                self.after_cancel(self._undo_burst_after)
+            self._undo_burst_after = self.after(_UNDO_BURST_MS, self._end_undo_burst)
+            if burst == self._undo_burst:
+                return
         try:
             self._undo_stack.append(self._snapshot())
             if len(self._undo_stack) > self._undo_max:
@@ -779,15 +1222,36 @@ class TripsEditorApp(tk.Tk):
             self._redo_stack.clear()
         except Exception:
             pass
+        self._undo_burst = burst
+
+    def _end_undo_burst(self):
+        self._undo_burst_after = None
+        self._undo_burst = None
+
+    def _schedule_refresh(self):
+        """Run refresh_ui once the event queue is idle; a burst of edits (e.g. held Ctrl+Z) rebuilds once."""
+        # data already changed; don't wait for the refresh
+        self._id_index = None
+        self._months_cache = None
+        self._cal_rows.clear()
+        if self._refresh_pending:
+            return
+        self._refresh_pending = True
+        self.after_idle(self._do_refresh)
+
+    def _do_refresh(self):
+        self._refresh_pending = False
+        self.refresh_ui()
 
     def undo(self):
         if not self._undo_stack:
             self._set_status("Nada para desfazer")
             return
         self._redo_stack.append(self._snapshot())
+        self._undo_burst = None
         self.data = self._undo_stack.pop()
         self.dirty = True
-        self.refresh_ui()
+        self._schedule_refresh()
         self._set_status("Desfazer ✅")
 
     def redo(self):
@@ -795,9 +1259,10 @@ class TripsEditorApp(tk.Tk):
             self._set_status("Nada para refazer")
             return
         self._undo_stack.append(self._snapshot())
+        self._undo_burst = None
         self.data = self._redo_stack.pop()
         self.dirty = True
-        self.refresh_ui()
+        self._schedule_refresh()
         self._set_status("Refazer ✅")
 
     def on_close(self):
@@ -815,6 +1280,10 @@ class TripsEditorApp(tk.Tk):
                 self.save_file()
                 if self.dirty:
                     return
+        if self._git_session is not None:
+            self._git_session.close()
+            self._git_session = None
+        self._io_pool.shutdown(wait=False)
         self.destroy()
 
 
@@ -895,6 +1364,8 @@ class TripsEditorApp(tk.Tk):
         months_frame.pack(fill=tk.X, pady=(0, 6))
 
         self._month_btns = {}
+        # (state, text) last applied to each button, so refreshes only touch buttons that change
+        self._month_btn_shown: dict[int, tuple[str, str]] = {}
         month_labels = ["jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
         for i, lab in enumerate(month_labels, start=1):
             r = (i - 1) // 3
@@ -902,6 +1373,7 @@ class TripsEditorApp(tk.Tk):
             btn = ttk.Button(months_frame, text=lab, width=4, command=lambda m=i: self._select_month_button(m))
             btn.grid(row=r, column=c, padx=1, pady=1, sticky="we")
             self._month_btns[i] = btn
+            self._month_btn_shown[i] = (tk.NORMAL, lab)
 
         for c in range(3):
             months_frame.grid_columnconfigure(c, weight=1)
@@ -1023,8 +1495,9 @@ class TripsEditorApp(tk.Tk):
         self.seg_tree.heading("free", text="Livres")
         self.seg_tree.column("from", width=180, anchor="w")
         self.seg_tree.column("to", width=180, anchor="w")
-        self.seg_tree.column("used", width=80, anchor="center")
-        self.seg_tree.column("free", width=70, anchor="center")
+        # Number columns keep a fixed width; only the city columns absorb resizes.
+        self.seg_tree.column("used", width=80, anchor="center", stretch=False)
+        self.seg_tree.column("free", width=70, anchor="center", stretch=False)
         self.seg_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         seg_scroll = ttk.Scrollbar(seg_frame, orient="vertical", command=self.seg_tree.yview)
@@ -1143,45 +1616,56 @@ class TripsEditorApp(tk.Tk):
             except Exception:
                 pass
 
-    def _show_trip_context_menu(self, event):
+    def _build_context_menus(self):
+        """Create the right-click menus once; the show methods only toggle entry states."""
         menu = tk.Menu(self, tearoff=0)
-        has_sel = self.current_index is not None
-
         menu.add_command(label="Nova viagem", command=self.new_trip)
         menu.add_command(label="Nova (template)", command=self.new_trip_template)
         menu.add_separator()
-        menu.add_command(
-            label="Duplicar",
-            command=self.duplicate_trip,
-            state=(tk.NORMAL if has_sel else tk.DISABLED),
-        )
-        menu.add_command(
-            label="Remover",
-            command=self.delete_trip,
-            state=(tk.NORMAL if has_sel else tk.DISABLED),
-        )
+        menu.add_command(label="Duplicar", command=self.duplicate_trip)
+        menu.add_command(label="Remover", command=self.delete_trip)
         menu.add_separator()
+        menu.add_command(label="Copiar id", command=self._copy_trip_id)
+        menu.add_command(label="Copiar resumo (linha)", command=self._copy_trip_label)
+        self._trip_menu = menu
+        self._trip_menu_sel_entries = (3, 4, 6, 7)  # need a selected trip
 
-        def _copy_id():
-            if self.current_index is None:
-                return
-            tid = str(self.data["trips"][self.current_index].get("id", ""))
-            self.clipboard_clear()
-            self.clipboard_append(tid)
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Adicionar reserva", command=self.add_booking)
+        menu.add_command(label="Atualizar seleção", command=self.update_booking)
+        menu.add_command(label="Remover seleção", command=self.remove_booking)
+        menu.add_separator()
+        menu.add_command(label="Copiar reserva", command=self._copy_booking_line)
+        self._booking_menu = menu
 
-        def _copy_label():
-            if self.current_index is None:
-                return
-            txt = make_trip_label(self.data["trips"][self.current_index])
-            self.clipboard_clear()
-            self.clipboard_append(txt)
-
-        menu.add_command(label="Copiar id", command=_copy_id, state=(tk.NORMAL if has_sel else tk.DISABLED))
-        menu.add_command(
-            label="Copiar resumo (linha)",
-            command=_copy_label,
-            state=(tk.NORMAL if has_sel else tk.DISABLED),
-        )
+    def _copy_trip_id(self):
+        if self.current_index is None:
+            return
+        tid = str(self.data["trips"][self.current_index].get("id", ""))
+        self.clipboard_clear()
+        self.clipboard_append(tid)
+
+    def _copy_trip_label(self):
+        if self.current_index is None:
+            return
+        txt = make_trip_label(self.data["trips"][self.current_index])
+        self.clipboard_clear()
+        self.clipboard_append(txt)
+
+    def _copy_booking_line(self):
+        sel = self.bookings.selection()
+        if not sel:
+            return
+        vals = self.bookings.item(sel[0], "values")
+        txt = f"{vals[0]} ({vals[1]} → {vals[2]})" if len(vals) >= 3 else ""
+        self.clipboard_clear()
+        self.clipboard_append(txt)
+
+    def _show_trip_context_menu(self, event):
+        menu = self._trip_menu
+        state = tk.NORMAL if self.current_index is not None else tk.DISABLED
+        for idx in self._trip_menu_sel_entries:
+            menu.entryconfigure(idx, state=state)
 
         try:
             menu.tk_popup(event.x_root, event.y_root)
@@ -1189,44 +1673,35 @@ class TripsEditorApp(tk.Tk):
             menu.grab_release()
 
     def _show_booking_context_menu(self, event):
-        menu = tk.Menu(self, tearoff=0)
+        menu = self._booking_menu
         has_trip = self.current_index is not None
-        sel = self.bookings.selection()
-        has_sel = bool(sel)
+        has_sel = bool(self.bookings.selection())
 
-        menu.add_command(
-            label="Adicionar reserva",
-            command=self.add_booking,
-            state=(tk.NORMAL if has_trip else tk.DISABLED),
-        )
-        menu.add_command(
-            label="Atualizar seleção",
-            command=self.update_booking,
-            state=(tk.NORMAL if (has_trip and has_sel) else tk.DISABLED),
-        )
-        menu.add_command(
-            label="Remover seleção",
-            command=self.remove_booking,
-            state=(tk.NORMAL if (has_trip and has_sel) else tk.DISABLED),
-        )
-        menu.add_separator()
-
-        def _copy_booking_line():
-            if not has_sel:
-                return
-            iid = sel[0]
-            vals = self.bookings.item(iid, "values")
-            txt = f"{vals[0]} ({vals[1]} → {vals[2]})" if len(vals) >= 3 else ""
-            self.clipboard_clear()
-            self.clipboard_append(txt)
-
-        menu.add_command(label="Copiar reserva", command=_copy_booking_line, state=(tk.NORMAL if has_sel else tk.DISABLED))
+        menu.entryconfigure(0, state=(tk.NORMAL if has_trip else tk.DISABLED))
+        menu.entryconfigure(1, state=(tk.NORMAL if (has_trip and has_sel) else tk.DISABLED))
+        menu.entryconfigure(2, state=(tk.NORMAL if (has_trip and has_sel) else tk.DISABLED))
+        menu.entryconfigure(4, state=(tk.NORMAL if has_sel else tk.DISABLED))
 
         try:
             menu.tk_popup(event.x_root, event.y_root)
         finally:
             menu.grab_release()
 
+    def _schedule_ui_refresh(self):
+        """Update title/file label and button states once the event queue is idle.
+
+        Mutations often trigger this several times in a row (edit + refresh, undo bursts);
+        the flag collapses them into a single _update_dirty_ui pass.
+        """
+        if self._ui_refresh_pending:
+            return
+        self._ui_refresh_pending = True
+        self.after_idle(self._flush_ui_refresh)
+
+    def _flush_ui_refresh(self):
+        self._ui_refresh_pending = False
+        self._update_dirty_ui()
+
     def _update_dirty_ui(self):
         star = " *" if self.dirty else ""
         self.title(f"Editor de trips.json{star}")
@@ -1319,14 +1794,23 @@ class TripsEditorApp(tk.Tk):
         if not hasattr(self, "txt_log"):
             return
         try:
-            ts = datetime.datetime.now().strftime("%H:%M:%S")
-            msg = f"[{ts}] {text}\n"
+            # Publish logs arrive in bursts; format the timestamp once per second
+            now = time.time()
+            sec = int(now)
+            if sec != self._log_ts_sec:
+                self._log_ts = time.strftime("%H:%M:%S", time.localtime(now))
+                self._log_ts_sec = sec
+            msg = f"[{self._log_ts}] {text}\n"
             self.txt_log.configure(state=tk.NORMAL)
             self.txt_log.insert(tk.END, msg)
-            # Trim old lines
-            lines = int(self.txt_log.index('end-1c').split('.')[0])
+            # Trim old lines (line count kept in Python; the text ends with "\n", so lines = newlines + 1)
+            self._log_newlines += msg.count("\n")
+            lines = self._log_newlines + 1
             if lines > self._log_lines_max:
-                self.txt_log.delete('1.0', f"{lines - self._log_lines_max}.0")
+                drop = lines - self._log_lines_max - 1
+                if drop > 0:
+                    self.txt_log.delete('1.0', f"{drop + 1}.0")
+                    self._log_newlines -= drop
             self.txt_log.see(tk.END)
             self.txt_log.configure(state=tk.DISABLED)
         except Exception:
@@ -1338,26 +1822,43 @@ class TripsEditorApp(tk.Tk):
         try:
             self.txt_log.configure(state=tk.NORMAL)
             self.txt_log.delete('1.0', tk.END)
+            self._log_newlines = 0
             self.txt_log.configure(state=tk.DISABLED)
         except Exception:
             pass
 
     def _on_stop_autocomplete(self, _evt=None):
+        """Debounce: só completa depois de ~120 ms sem teclas, com o texto final."""
+        if self._ac_after is not None:
+            try:
+                self.after_cancel(self._ac_after)
+            except Exception:
+                pass
+        self._ac_after = self.after(120, self._do_stop_autocomplete)
+
+    def _do_stop_autocomplete(self):
         """Autocomplete simples: completa a partir do prefixo digitado."""
+        self._ac_after = None
         try:
             typed = (self.var_stop_new.get() or "").strip()
             if not typed:
                 return
-            typed_low = typed.lower()
-            for city in CITIES_COMMON:
-                if city.lower().startswith(typed_low) and city != typed:
-                    self.var_stop_new.set(city)
-                    try:
-                        self.cmb_stop_new.icursor(len(typed))
-                        self.cmb_stop_new.selection_range(len(typed), tk.END)
-                    except Exception:
-                        pass
-                    return
+            typed_low = typed.casefold()
+            # Matches are a contiguous run in the sorted index; keep the first in CITIES_COMMON order.
+            best = None
+            i = bisect.bisect_left(_CITIES_FOLDED, (typed_low,))
+            while i < len(_CITIES_FOLDED) and _CITIES_FOLDED[i][0].startswith(typed_low):
+                _low, pos, city = _CITIES_FOLDED[i]
+                if city != typed and (best is None or pos < best[0]):
+                    best = (pos, city)
+                i += 1
+            if best is not None:
+                self.var_stop_new.set(best[1])
+                try:
+                    self.cmb_stop_new.icursor(len(typed))
+                    self.cmb_stop_new.selection_range(len(typed), tk.END)
+                except Exception:
+                    pass
         except Exception:
             pass
 
@@ -1394,216 +1895,289 @@ class TripsEditorApp(tk.Tk):
             # Choose a folder to run git commands from:
             # - if a json file is open, use its folder
             # - otherwise use the folder containing this script
-            base_dir = os.path.dirname(self.file_path) if self.file_path else os.path.dirname(os.path.abspath(__file__))
+            base_dir = os.path.dirname(self.file_path) if self.file_path else self._script_dir
 
-            repo_root = find_repo_root(base_dir)
-            if not repo_root:
-                messagebox.showerror(
-                    "GitHub",
-                    "Não encontrei um repositório Git neste diretório.\n\n"
-                    "Dica: abra esta pasta no terminal e rode:\n"
-                    "  git init  (se ainda não)\n"
-                    "  git remote add origin <SSH>\n"
-                    "  git add .\n  git commit -m \"primeiro commit\"\n  git push -u origin main"
-                )
-                return
-            ensure_ds_store_ignored(repo_root, log=self._append_log)
+            self._publish_probe_step(base_dir, then=self._publish_after_probes)
+        finally:
+            if not self._publish_step_pending:
+                self._end_publish()
 
-            # Ensure SSH agent/key are ready (avoids needing a separate terminal to type passphrase).
-            if not ensure_ssh_auth_ready(self):
+    def _publish_after_probes(self, repo_root: str | None):
+        if not repo_root:
+            messagebox.showerror(
+                "GitHub",
+                "Não encontrei um repositório Git neste diretório.\n\n"
+                "Dica: abra esta pasta no terminal e rode:\n"
+                "  git init  (se ainda não)\n"
+                "  git remote add origin <SSH>\n"
+                "  git add .\n  git commit -m \"primeiro commit\"\n  git push -u origin main"
+            )
+            return
+        ensure_ds_store_ignored(repo_root, log=self._append_log)
+
+        # Ensure SSH agent/key are ready (avoids needing a separate terminal to type passphrase).
+        if not ensure_ssh_auth_ready(self):
+            return
+        # Optional: quick diagnostic (doesn't block publishing if GitHub returns non-zero on success)
+        self._publish_step(probe_github_ssh, then=lambda res: self._publish_after_ssh_test(repo_root, res))
+
+    def _end_publish(self):
+        self._publishing = False
+        try:
+            self.btn_publish.configure(state=tk.NORMAL)
+        except Exception:
+            pass
+
+    def _publish_step(self, func, *args, then):
+        """Run func(*args, log=...) on the I/O pool and continue with then(result) on the Tk thread.
+
+        Network steps (ssh -T, push, pull) can block for seconds; running them here keeps the
+        window responsive. Log lines are queued by the worker and written by the Tk thread.
+        Publishing ends (button re-enabled) once a `then` returns without starting another step.
+        """
+        self._publish_step_pending = True
+        lines: queue.SimpleQueue = queue.SimpleQueue()
+        fut = self._io_pool.submit(func, *args, log=lines.put)
+
+        def flush_log():
+            while not lines.empty():
+                self._append_log(lines.get())
+
+        def poll():
+            flush_log()
+            if not fut.done():
+                self.after(30, poll)
                 return
-            # Optional: quick diagnostic (doesn't block publishing if GitHub returns non-zero on success)
+            self._publish_step_pending = False
             try:
-                test_github_ssh(self)
-            except Exception:
-                pass
+                result = fut.result()
+            except Exception as e:
+                messagebox.showerror("GitHub", f"Erro inesperado ao publicar.\n\n{e}")
+                self._end_publish()
+                return
+            try:
+                then(result)
+            finally:
+                if not self._publish_step_pending:
+                    self._end_publish()
 
-            # Ensure file is saved first
-            if self.dirty:
-                if not messagebox.askyesno("GitHub", "Você tem alterações não salvas. Salvar antes de publicar?"):
-                    return
-                self.save_file()
-                if self.dirty:
-                    return  # save failed or user canceled
+        self.after(30, poll)
 
-            # Ask commit message
-            default_msg = f"atualiza calendário ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M')})"
-            msg = simple_prompt(self, "Mensagem do commit", "Digite uma mensagem para o commit:", default_msg)
-            if msg is None:
+    def _publish_after_ssh_test(self, repo_root: str, probe: tuple[int, str]):
+        try:
+            report_github_ssh(*probe)
+        except Exception:
+            pass
+
+        # Ensure file is saved first
+        if self.dirty:
+            if not messagebox.askyesno("GitHub", "Você tem alterações não salvas. Salvar antes de publicar?"):
                 return
-            msg = msg.strip() or default_msg
-
-            # --- Helper functions for status and staged files ---
-            def _get_status_porcelain() -> str:
-                scode, sout, serr = run_git(["status", "--porcelain"], cwd=repo_root, log=self._append_log)
-                if scode != 0:
-                    return ""
-                return sout.strip()
-
-            def _get_staged_names() -> list[str]:
-                dcode, dout, derr = run_git(["diff", "--cached", "--name-only"], cwd=repo_root, log=self._append_log)
-                if dcode != 0:
-                    return []
-                return [ln.strip() for ln in dout.splitlines() if ln.strip()]
-
-            # Stage files
-            status_before = _get_status_porcelain()
-            if status_before and any(line.endswith(".DS_Store") and (line[:2].strip() != "??") for line in status_before.splitlines()):
+            self.save_file()
+            if self.dirty:
+                return  # save failed or user canceled
+
+        # Ask commit message
+        default_msg = f"atualiza calendário ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M')})"
+        msg = simple_prompt(self, "Mensagem do commit", "Digite uma mensagem para o commit:", default_msg)
+        if msg is None:
+            return
+        msg = msg.strip() or default_msg
+
+        # --- Helper for staged files ---
+        def _get_staged_names(check_ds_store: bool = True) -> list[str]:
+            """Staged paths from `git diff --cached`; a staged .DS_Store is dropped from the index first."""
+            dcode, dout, derr = run_git(["diff", "--cached", "--name-only"], cwd=repo_root, log=self._append_log)
+            if dcode != 0:
+                return []
+            if check_ds_store and _DS_STORE_LINE_RE.search(dout):
                 self._append_log(".DS_Store detectado; tentei ignorar/remover do índice automaticamente.")
                 ensure_ds_store_ignored(repo_root, log=self._append_log)
+                # a tracked .DS_Store now shows as a staged deletion, which should be committed
+                return _get_staged_names(check_ds_store=False)
+            return [ln.strip() for ln in dout.splitlines() if ln.strip()]
+
+        # A tracked .DS_Store with changes (staged or not) is dropped from the index before staging,
+        # whichever mode is chosen below; its deletion is then committed with the JSON.
+        scode, status_before, serr = run_git(["status", "--porcelain"], cwd=repo_root, log=self._append_log)
+        if scode == 0 and _DS_STORE_STATUS_RE.search(status_before):
+            self._append_log(".DS_Store detectado; tentei ignorar/remover do índice automaticamente.")
+            ensure_ds_store_ignored(repo_root, log=self._append_log)
 
-            stage_all = False
-            if self.file_path:
-                stage_all = not messagebox.askyesno(
-                    "GitHub",
-                    "Publicar apenas o arquivo JSON aberto (recomendado)?\n\n"
-                    "SIM → Apenas o arquivo atual\n"
-                    "NÃO → Todos os arquivos do repositório",
-                )
+        # Stage files
+        stage_all = False
+        if self.file_path:
+            stage_all = not messagebox.askyesno(
+                "GitHub",
+                "Publicar apenas o arquivo JSON aberto (recomendado)?\n\n"
+                "SIM → Apenas o arquivo atual\n"
+                "NÃO → Todos os arquivos do repositório",
+            )
 
-            if (not stage_all) and self.file_path:
+        if (not stage_all) and self.file_path:
+            if self._json_matches_index(repo_root):
+                # Already staged as-is; skip the `git add` spawn.
+                self._append_log("JSON já está no índice; nada a adicionar.")
+                code, out, err = 0, "", ""
+            else:
                 rel = os.path.relpath(self.file_path, repo_root)
                 code, out, err = run_git(["add", rel], cwd=repo_root, log=self._append_log)
-            else:
+        else:
+            code, out, err = run_git(["add", "-A"], cwd=repo_root, log=self._append_log)
+        if code != 0:
+            messagebox.showerror("GitHub", f"Falha no git add.\n\n{err or out}")
+            return
+
+        # If nothing is staged, offer to stage everything (common when JSON wasn't changed)
+        staged = _get_staged_names()
+        if not staged:
+            if messagebox.askyesno(
+                "GitHub",
+                "Não há alterações preparadas para commit (staged).\n\n"
+                "Isso pode acontecer se o JSON não mudou, mas há outros arquivos modificados (ex.: editor_trips.py, .DS_Store).\n\n"
+                "Deseja preparar TODOS os arquivos do repositório para commit agora?",
+            ):
                 code, out, err = run_git(["add", "-A"], cwd=repo_root, log=self._append_log)
-            if code != 0:
-                messagebox.showerror("GitHub", f"Falha no git add.\n\n{err or out}")
-                return
+                if code != 0:
+                    messagebox.showerror("GitHub", f"Falha no git add -A.\n\n{err or out}")
+                    return
+                staged = _get_staged_names()
 
-            # If nothing is staged, offer to stage everything (common when JSON wasn't changed)
-            staged = _get_staged_names()
-            if not staged:
-                if messagebox.askyesno(
-                    "GitHub",
-                    "Não há alterações preparadas para commit (staged).\n\n"
-                    "Isso pode acontecer se o JSON não mudou, mas há outros arquivos modificados (ex.: editor_trips.py, .DS_Store).\n\n"
-                    "Deseja preparar TODOS os arquivos do repositório para commit agora?",
-                ):
-                    code, out, err = run_git(["add", "-A"], cwd=repo_root, log=self._append_log)
-                    if code != 0:
-                        messagebox.showerror("GitHub", f"Falha no git add -A.\n\n{err or out}")
-                        return
-                    staged = _get_staged_names()
-
-            # If still nothing staged, we can still push (useful if only pulling/rebasing), or abort.
-            if not staged:
-                if messagebox.askyesno(
-                    "GitHub",
-                    "Ainda não há nada para commitar.\n\n"
-                    "Deseja tentar apenas o git push mesmo assim?",
-                ):
-                    code, out, err = run_git(["push"], cwd=repo_root, log=self._append_log)
-                    if code != 0:
-                        messagebox.showerror("GitHub", f"Falha no git push.\n\n{err or out}")
-                        return
-                    self._append_log("Push concluído ✅")
-                    messagebox.showinfo("GitHub", "Push concluído ✅")
+        # If still nothing staged, we can still push (useful if only pulling/rebasing), or abort.
+        if not staged:
+            if messagebox.askyesno(
+                "GitHub",
+                "Ainda não há nada para commitar.\n\n"
+                "Deseja tentar apenas o git push mesmo assim?",
+            ):
+                self._publish_step(run_git, ["push"], repo_root, then=self._publish_after_plain_push)
+            return
+
+        # Commit and push in one process (commit may fail if nothing to commit)
+        self._publish_step(
+            run_git_pipeline, [["commit", "-m", msg], ["push"]], repo_root,
+            then=lambda res: self._publish_after_commit_push(repo_root, *res),
+        )
+
+    def _publish_after_plain_push(self, res: tuple[int, str, str]):
+        code, out, err = res
+        if code != 0:
+            messagebox.showerror("GitHub", f"Falha no git push.\n\n{err or out}")
+            return
+        self._append_log("Push concluído ✅")
+        messagebox.showinfo("GitHub", "Push concluído ✅")
+
+    def _publish_after_commit_push(self, repo_root: str, code: int, step: int, out: str, err: str):
+        if code != 0 and step == 0:
+            low_msg = (out + " " + err).lower()
+            # If nothing to commit, allow pushing anyway (useful when remote changed, etc.)
+            if ("nothing to commit" not in low_msg) and ("no changes added to commit" not in low_msg):
+                messagebox.showerror("GitHub", f"Falha no git commit.\n\n{err or out}")
                 return
+            self._append_log("Nada para commitar (nenhuma mudança staged).")
+            self._publish_step(run_git, ["push"], repo_root, then=lambda res: self._publish_after_push(repo_root, *res))
+            return
+        self._publish_after_push(repo_root, code, out, err)
 
-            # Commit (may fail if nothing to commit)
-            code, out, err = run_git(["commit", "-m", msg], cwd=repo_root, log=self._append_log)
-            if code != 0:
-                low_msg = (out + " " + err).lower()
-                # If nothing to commit, allow pushing anyway (useful when remote changed, etc.)
-                if ("nothing to commit" not in low_msg) and ("no changes added to commit" not in low_msg):
-                    messagebox.showerror("GitHub", f"Falha no git commit.\n\n{err or out}")
-                    return
-                self._append_log("Nada para commitar (nenhuma mudança staged).")
-
-            # Push
-            code, out, err = run_git(["push"], cwd=repo_root, log=self._append_log)
-            if code != 0:
-                msg_all = (out + "\n" + err).strip().lower()
-
-                # Common case: remote has commits not present locally (fetch first / rejected)
-                if ("fetch first" in msg_all) or ("rejected" in msg_all) or ("non-fast-forward" in msg_all):
-                    choice = messagebox.askyesnocancel(
-                        "GitHub",
-                        "O repositório remoto já tem commits e o push foi rejeitado.\n\n"
-                        "SIM  → Integrar mudanças do remoto (git pull --rebase) e tentar de novo (recomendado)\n"
-                        "NÃO  → Forçar push e sobrescrever o remoto (git push --force)\n"
-                        "CANCELAR → Não fazer nada agora"
-                    )
-                    if choice is None:
-                        return
-
-                    if choice is True:
-                        pcode, pout, perr = git_pull_rebase(repo_root, log=self._append_log)
-                        if pcode != 0:
-                            messagebox.showerror(
-                                "GitHub",
-                                "Falha ao integrar mudanças do remoto (git pull --rebase).\n\n"
-                                f"{perr or pout}\n\n"
-                                "Se aparecer conflito, resolva no VS Code e rode novamente.\n"
-                                "Dica terminal:\n"
-                                "  git status\n"
-                                "  git rebase --continue\n"
-                                "  git rebase --abort"
-                            )
-                            return
-
-                        # Try push again
-                        code2, out2, err2 = run_git(["push"], cwd=repo_root, log=self._append_log)
-                        if code2 != 0:
-                            messagebox.showerror("GitHub", f"Falha no git push após pull --rebase.\n\n{err2 or out2}")
-                            return
-                        self._append_log("Publicado com sucesso ✅")
-                        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
-                        return
-
-                    # Force push (overwrite remote)
-                    fcode, fout, ferr = run_git(["push", "--force"], cwd=repo_root, log=self._append_log)
-                    if fcode != 0:
-                        messagebox.showerror("GitHub", f"Falha no git push --force.\n\n{ferr or fout}")
-                        return
-                    self._append_log("Publicado com sucesso ✅")
-                    messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
+    def _publish_after_push(self, repo_root: str, code: int, out: str, err: str):
+        if code != 0:
+            msg_all = (out + "\n" + err).strip().lower()
+
+            # Common case: remote has commits not present locally (fetch first / rejected)
+            if ("fetch first" in msg_all) or ("rejected" in msg_all) or ("non-fast-forward" in msg_all):
+                choice = messagebox.askyesnocancel(
+                    "GitHub",
+                    "O repositório remoto já tem commits e o push foi rejeitado.\n\n"
+                    "SIM  → Integrar mudanças do remoto (git pull --rebase) e tentar de novo (recomendado)\n"
+                    "NÃO  → Forçar push e sobrescrever o remoto (git push --force)\n"
+                    "CANCELAR → Não fazer nada agora"
+                )
+                if choice is None:
                     return
 
-                # Other push errors
-                details = (err or out).strip()
-                low = (out + "\n" + err).lower()
-
-                if ("permission denied" in low) or ("publickey" in low) or ("could not read from remote repository" in low) or ("host key verification failed" in low) or ("batchmode" in low):
-                    messagebox.showerror(
-                        "GitHub",
-                        "Falha de autenticação SSH ao publicar.\n\n"
-                        f"{details}\n\n"
-                        "Como corrigir (no Terminal):\n"
-                        "1) Teste:  ssh -T git@github.com\n"
-                        "2) Carregue a chave no agente (macOS):\n"
-                        "   eval \"$(ssh-agent -s)\"\n"
-                        "   ssh-add --apple-use-keychain ~/.ssh/id_ed25519\n"
-                        "3) Confirme: ssh-add -l\n"
-                        "4) Tente novamente o push.\n\n"
-                        "Se sua rede bloquear a porta 22, configure GitHub via 443 em ~/.ssh/config:\n"
-                        "Host github.com\n"
-                        "  HostName ssh.github.com\n"
-                        "  User git\n"
-                        "  Port 443\n"
-                        "  IdentityFile ~/.ssh/id_ed25519\n"
+                if choice is True:
+                    branch = self._get_default_branch(repo_root)
+                    self._publish_step(
+                        functools.partial(git_pull_rebase, branch=branch), repo_root,
+                        then=lambda res: self._publish_after_pull(repo_root, *res),
                     )
                     return
 
+                # Force push (overwrite remote)
+                self._publish_step(run_git, ["push", "--force"], repo_root, then=self._publish_after_force_push)
+                return
+
+            # Other push errors
+            details = (err or out).strip()
+            low = (out + "\n" + err).lower()
+
+            if ("permission denied" in low) or ("publickey" in low) or ("could not read from remote repository" in low) or ("host key verification failed" in low) or ("batchmode" in low):
                 messagebox.showerror(
                     "GitHub",
-                    "Falha no git push.\n\n"
+                    "Falha de autenticação SSH ao publicar.\n\n"
                     f"{details}\n\n"
-                    "Dica: no terminal, confira:\n"
-                    "  git remote -v\n"
-                    "  git status\n"
-                    "  git branch\n"
+                    "Como corrigir (no Terminal):\n"
+                    "1) Teste:  ssh -T git@github.com\n"
+                    "2) Carregue a chave no agente (macOS):\n"
+                    "   eval \"$(ssh-agent -s)\"\n"
+                    "   ssh-add --apple-use-keychain ~/.ssh/id_ed25519\n"
+                    "3) Confirme: ssh-add -l\n"
+                    "4) Tente novamente o push.\n\n"
+                    "Se sua rede bloquear a porta 22, configure GitHub via 443 em ~/.ssh/config:\n"
+                    "Host github.com\n"
+                    "  HostName ssh.github.com\n"
+                    "  User git\n"
+                    "  Port 443\n"
+                    "  IdentityFile ~/.ssh/id_ed25519\n"
                 )
                 return
 
-            self._append_log("Publicado com sucesso ✅")
-            messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
-        finally:
-            self._publishing = False
-            try:
-                self.btn_publish.configure(state=tk.NORMAL)
-            except Exception:
-                pass
+            messagebox.showerror(
+                "GitHub",
+                "Falha no git push.\n\n"
+                f"{details}\n\n"
+                "Dica: no terminal, confira:\n"
+                "  git remote -v\n"
+                "  git status\n"
+                "  git branch\n"
+            )
+            return
+
+        self._append_log("Publicado com sucesso ✅")
+        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
+
+    def _publish_after_pull(self, repo_root: str, pcode: int, pout: str, perr: str):
+        if pcode != 0:
+            messagebox.showerror(
+                "GitHub",
+                "Falha ao integrar mudanças do remoto (git pull --rebase).\n\n"
+                f"{perr or pout}\n\n"
+                "Se aparecer conflito, resolva no VS Code e rode novamente.\n"
+                "Dica terminal:\n"
+                "  git status\n"
+                "  git rebase --continue\n"
+                "  git rebase --abort"
+            )
+            return
+
+        # Try push again
+        self._publish_step(run_git, ["push"], repo_root, then=self._publish_after_retry_push)
+
+    def _publish_after_retry_push(self, res: tuple[int, str, str]):
+        code2, out2, err2 = res
+        if code2 != 0:
+            messagebox.showerror("GitHub", f"Falha no git push após pull --rebase.\n\n{err2 or out2}")
+            return
+        self._append_log("Publicado com sucesso ✅")
+        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
+
+    def _publish_after_force_push(self, res: tuple[int, str, str]):
+        fcode, fout, ferr = res
+        if fcode != 0:
+            messagebox.showerror("GitHub", f"Falha no git push --force.\n\n{ferr or fout}")
+            return
+        self._append_log("Publicado com sucesso ✅")
+        messagebox.showinfo("GitHub", "Publicado com sucesso! ✅")
 
     # ---------- File ----------
     def open_file(self):
@@ -1624,12 +2198,13 @@ class TripsEditorApp(tk.Tk):
             return
 
         self.file_path = path
+        self._repo_root_cache.clear()
+        self._default_branch_cache.clear()
         save_last_json_path(path)
         self.lbl_file.configure(text=f"Arquivo: {path}")
         self.current_index = None
         self.dirty = False
-        self._update_dirty_ui()
-        self._update_controls_state()
+        self._schedule_ui_refresh()
         self.refresh_ui()
 
     def save_file(self):
@@ -1642,7 +2217,7 @@ class TripsEditorApp(tk.Tk):
 
             safe_save_json(self.file_path, self.data)
             self.dirty = False
-            self._update_dirty_ui()
+            self._schedule_ui_refresh()
             self._append_log("Arquivo salvo ✅")
             self._set_status("Salvo")
         except Exception as e:
@@ -1657,6 +2232,8 @@ class TripsEditorApp(tk.Tk):
         if not path:
             return
         self.file_path = path
+        self._repo_root_cache.clear()
+        self._default_branch_cache.clear()
         save_last_json_path(path)
         self.lbl_file.configure(text=f"Arquivo: {path}")
         self.save_file()
@@ -1669,21 +2246,28 @@ class TripsEditorApp(tk.Tk):
     # ---------- Trips CRUD ----------
 
     def refresh_ui(self):
+        # every trip add/remove/edit/sort/load ends here
+        self._id_index = None
+        self._months_cache = None
+        self._cal_rows.clear()
+        trips = self.data.get("trips", [])
+        # One pass over the dates serves the label prefix, the colours and the default selection.
+        next_idx = self._find_next_upcoming_index()
         # Marca textual temporária para destacar a próxima viagem
-        next_idx_for_label = self._find_next_upcoming_index()
-        for i, t in enumerate(self.data.get("trips", [])):
+        for i, t in enumerate(trips):
             if isinstance(t, dict):
-                t["_ui_prefix"] = "[PRÓXIMA]" if (next_idx_for_label is not None and i == next_idx_for_label) else ""
+                t["_ui_prefix"] = "[PRÓXIMA]" if (next_idx is not None and i == next_idx) else ""
         # Listbox
         self.listbox.delete(0, tk.END)
-        for t in self.data.get("trips", []):
-            self.listbox.insert(tk.END, make_trip_label(t))
+        labels = [make_trip_label(t) for t in trips]
+        if labels:
+            # Listbox insert is variadic: one Tcl call for all rows
+            self.listbox.insert(tk.END, *labels)
 
-        self._decorate_trip_list()
+        self._decorate_trip_list(next_idx)
 
         # If nothing is selected, prefer the next upcoming trip
         if self.current_index is None:
-            next_idx = self._find_next_upcoming_index()
             if next_idx is not None:
                 self.current_index = next_idx
                 try:
@@ -1692,7 +2276,7 @@ class TripsEditorApp(tk.Tk):
                     self.listbox.see(next_idx)
                 except Exception:
                     pass
-                self._load_trip_into_form(self.data["trips"][next_idx])
+                self._load_trip_into_form(trips[next_idx])
             else:
                 self._load_trip_into_form(None)
             self._clear_validation()
@@ -1704,19 +2288,21 @@ class TripsEditorApp(tk.Tk):
             except Exception:
                 pass
 
-        self._update_dirty_ui()
-        self._update_controls_state()
+        self._schedule_ui_refresh()
 
         # Update calendar month/year options
         try:
             months = self._month_options()  # list of YYYY-MM
-            years = sorted({m[:4] for m in months if len(m) >= 7})
+            # months is sorted, so its distinct year prefixes already come out in order
+            years = list(dict.fromkeys(m[:4] for m in months))
 
-            # Update year combobox
-            try:
-                self.cmb_year.configure(values=years)
-            except Exception:
-                pass
+            # Update year combobox (only when the set of years changed)
+            if years != self._cal_years:
+                try:
+                    self.cmb_year.configure(values=years)
+                    self._cal_years = years
+                except Exception:
+                    pass
 
             # Choose a default selection
             if months:
@@ -1751,41 +2337,58 @@ class TripsEditorApp(tk.Tk):
         except Exception:
             pass
 
+    def _get_months(self) -> tuple[list[str], set[tuple[str, int]], dict[str, list[tuple[str, int]]]]:
+        """Month lookups over the trips, rebuilt only after the trips changed.
+
+        Returns (sorted YYYY-MM list, {(year, month)}, {YYYY-MM: [(date, trip index), ...]}).
+        """
+        if self._months_cache is None:
+            by_month: dict[str, list[tuple[str, int]]] = {}
+            for idx, t in enumerate(self.data.get("trips", [])):
+                d = str(t.get("date", "")).strip()
+                if _is_iso_date(d):
+                    by_month.setdefault(d[:7], []).append((d, idx))  # YYYY-MM
+            # _is_iso_date checked the shape, so m[5:7] is two digits
+            self._months_cache = (sorted(by_month), {(m[:4], int(m[5:7])) for m in by_month}, by_month)
+        return self._months_cache
+
     def _month_options(self) -> list[str]:
-        months: set[str] = set()
-        for t in self.data.get("trips", []):
-            d = str(t.get("date", "")).strip()
-            if DATE_RE.match(d):
-                months.add(d[:7])  # YYYY-MM
-        return sorted(months)
+        """Sorted YYYY-MM list. Shared with the cache: don't mutate."""
+        return self._get_months()[0]
 
     def _populate_calendar(self, month: str):
-        for iid in self.cal_tree.get_children():
-            self.cal_tree.delete(iid)
-
-        grouped: dict[str, list[dict]] = {}
-        for idx, t in enumerate(self.data.get("trips", [])):
-            d = str(t.get("date", "")).strip()
-            if DATE_RE.match(d) and d.startswith(month):
-                grouped.setdefault(d, []).append({"idx": idx, "trip": t})
-
-        for d in sorted(grouped.keys()):
-            labels = []
-            for item in grouped[d]:
-                t = item["trip"]
-                direction = t.get("direction", "")
-                short = "IDA" if direction == "ida" else ("VOLTA" if direction == "volta" else str(direction))
-                title = (t.get("title", "") or "").strip()
-                labels.append(f"{short} {title}".strip())
-            iids = ",".join(str(item["idx"]) for item in grouped[d])
-            self.cal_tree.insert("", tk.END, iid=iids, values=(d, " | ".join(labels)))
+        children = self.cal_tree.get_children()
+        if children:
+            self.cal_tree.delete(*children)
+
+        rows = self._cal_rows.get(month)
+        if rows is None:
+            trips = self.data.get("trips", [])
+            rows = []
+            # only this month's trips; same-day trips keep list order
+            for d, group in itertools.groupby(sorted(self._get_months()[2].get(month, ())), key=operator.itemgetter(0)):
+                group = list(group)
+                labels = []
+                for _d, idx in group:
+                    t = trips[idx]
+                    direction = t.get("direction", "")
+                    short = _DIR_SHORT.get(direction, str(direction))
+                    title = (t.get("title", "") or "").strip()
+                    labels.append(f"{short} {title}".strip())
+                iids = ",".join(str(idx) for _d, idx in group)
+                rows.append((iids, d, " | ".join(labels)))
+            self._cal_rows[month] = rows
+
+        insert = self.cal_tree.insert
+        for iids, d, text in rows:
+            insert("", tk.END, iid=iids, values=(d, text))
 
     def on_select_month(self, _evt=None):
         # If user changed year, keep the month number (if any) and switch year
         year = (self.var_year.get() or "").strip() if hasattr(self, "var_year") else ""
         cur = (self.var_month.get() or "").strip()
 
-        if year and DATE_RE.match(cur + "-01") is None:
+        if year and not _is_iso_date(cur + "-01"):
             # cur might be empty; choose January by default
             self.var_month.set(f"{year}-01")
         elif year and len(cur) >= 7 and cur[:4].isdigit():
@@ -1817,18 +2420,14 @@ class TripsEditorApp(tk.Tk):
                 self.listbox.see(first)
             except Exception:
                 pass
-        self._update_controls_state()
+        self._schedule_ui_refresh()
 
     def _update_month_buttons_state(self):
         """Enable/disable month buttons based on available months and highlight selected month."""
         if not hasattr(self, "_month_btns"):
             return
 
-        months = self._month_options()
-        available = set()
-        for m in months:
-            if len(m) >= 7 and m[5:7].isdigit():
-                available.add((m[:4], int(m[5:7])))
+        available = self._get_months()[1]
 
         sel = (self.var_month.get() or "").strip()
         sel_year = sel[:4] if len(sel) >= 7 else ""
@@ -1836,32 +2435,30 @@ class TripsEditorApp(tk.Tk):
 
         cur_year = (self.var_year.get() or "").strip() if hasattr(self, "var_year") else sel_year
 
+        highlight = bool(cur_year) and sel_year == cur_year
+        shown = self._month_btn_shown
         for mnum, btn in self._month_btns.items():
             # enable only if there is at least one trip in that (year, month); if no year selected, enable all
             if cur_year:
                 state = tk.NORMAL if (cur_year, mnum) in available else tk.DISABLED
             else:
                 state = tk.NORMAL
-            try:
-                btn.configure(state=state)
-            except Exception:
-                pass
-
+            prev_state, prev_text = shown[mnum]
             # simple visual cue: put brackets around selected month
+            base = prev_text.strip("[]")
+            text = f"[{base}]" if (highlight and sel_m == mnum) else base
+            if (state, text) == (prev_state, prev_text):
+                continue
             try:
-                base = btn.cget("text").strip("[]")
-                if sel_m == mnum and sel_year == cur_year and cur_year:
-                    btn.configure(text=f"[{base}]")
-                else:
-                    btn.configure(text=base)
+                btn.configure(state=state, text=text)
+                shown[mnum] = (state, text)
             except Exception:
                 pass
 
     def sort_trips(self):
-        self.data["trips"].sort(key=lambda t: (t.get("date", ""), t.get("direction", ""), t.get("id", "")))
+        self.data["trips"].sort(key=_trip_sort_key)
         self.dirty = True
-        self._update_dirty_ui()
-        self.refresh_ui()
+        self._schedule_refresh()
 
     def add_stop(self):
         self._push_undo()
@@ -1871,7 +2468,7 @@ class TripsEditorApp(tk.Tk):
         self.stops_listbox.insert(tk.END, s)
         self.var_stop_new.set("")
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
 
     def remove_stop(self):
         self._push_undo()
@@ -1880,10 +2477,10 @@ class TripsEditorApp(tk.Tk):
             return
         self.stops_listbox.delete(sel[0])
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
 
     def move_stop_up(self):
-        self._push_undo()
+        self._push_undo("move_stop")
         sel = self.stops_listbox.curselection()
         if not sel or sel[0] == 0:
             return
@@ -1893,10 +2490,10 @@ class TripsEditorApp(tk.Tk):
         self.stops_listbox.insert(i - 1, val)
         self.stops_listbox.selection_set(i - 1)
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
 
     def move_stop_down(self):
-        self._push_undo()
+        self._push_undo("move_stop")
         sel = self.stops_listbox.curselection()
         if not sel:
             return
@@ -1908,7 +2505,7 @@ class TripsEditorApp(tk.Tk):
         self.stops_listbox.insert(i + 1, val)
         self.stops_listbox.selection_set(i + 1)
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
 
     def on_select_trip(self, _evt=None):
         sel = self.listbox.curselection()
@@ -1919,7 +2516,7 @@ class TripsEditorApp(tk.Tk):
         trip = self.data["trips"][idx]
         self._load_trip_into_form(trip)
         self._decorate_trip_list()
-        self._update_controls_state()
+        self._schedule_ui_refresh()
 
     def new_trip(self):
         self._push_undo()
@@ -1934,12 +2531,9 @@ class TripsEditorApp(tk.Tk):
         }
         self.data["trips"].append(trip)
         self.dirty = True
-        self._update_dirty_ui()
-        self.refresh_ui()
         self.current_index = len(self.data["trips"]) - 1
-        self.listbox.selection_clear(0, tk.END)
-        self.listbox.selection_set(self.current_index)
-        self.listbox.see(self.current_index)
+        # the refresh selects current_index once the list is rebuilt
+        self._schedule_refresh()
         self._load_trip_into_form(trip)
 
     def new_trip_template(self):
@@ -1989,12 +2583,9 @@ class TripsEditorApp(tk.Tk):
 
         self.data["trips"].append(trip)
         self.dirty = True
-        self._update_dirty_ui()
-        self.refresh_ui()
         self.current_index = len(self.data["trips"]) - 1
-        self.listbox.selection_clear(0, tk.END)
-        self.listbox.selection_set(self.current_index)
-        self.listbox.see(self.current_index)
+        # the refresh selects current_index once the list is rebuilt
+        self._schedule_refresh()
         self._load_trip_into_form(trip)
 
     def duplicate_trip(self):
@@ -2003,12 +2594,11 @@ class TripsEditorApp(tk.Tk):
             messagebox.showwarning("Selecione", "Selecione uma viagem para duplicar.")
             return
         src = self.data["trips"][self.current_index]
-        dup = json.loads(json.dumps(src))  # deep copy
+        dup = copy_trip(src)
         dup["id"] = (dup.get("id", "") + "-copy").strip("-")
         self.data["trips"].append(dup)
         self.dirty = True
-        self._update_dirty_ui()
-        self.refresh_ui()
+        self._schedule_refresh()
 
     def delete_trip(self):
         self._push_undo()
@@ -2021,8 +2611,7 @@ class TripsEditorApp(tk.Tk):
         del self.data["trips"][self.current_index]
         self.current_index = None
         self.dirty = True
-        self._update_dirty_ui()
-        self.refresh_ui()
+        self._schedule_refresh()
 
     def apply_trip_changes(self):
         self._push_undo()
@@ -2034,12 +2623,13 @@ class TripsEditorApp(tk.Tk):
         tid = self.var_id.get().strip()
         date = self.var_date.get().strip()
         # Normalize date like 2026-2-3 -> 2026-02-03
-        if date and "-" in date and DATE_RE.match(date) is None:
+        if date and "-" in date and not _is_iso_date(date):
             parts = date.split("-")
-            if len(parts) == 3 and all(p.isdigit() for p in parts):
+            # isascii: int() rejects some str.isdigit() characters (e.g. "²")
+            if len(parts) == 3 and all(p.isascii() and p.isdigit() for p in parts):
                 y, m, d = parts
                 if len(y) == 4:
-                    date = f"{y}-{m.zfill(2)}-{d.zfill(2)}"
+                    date = f"{y}-{int(m):02d}-{int(d):02d}"
                     self.var_date.set(date)
 
         direction = self.var_direction.get().strip()
@@ -2050,7 +2640,7 @@ class TripsEditorApp(tk.Tk):
             self._validation_error("O campo id é obrigatório.", self.ent_id)
             return
 
-        if not DATE_RE.match(date):
+        if not _is_iso_date(date):
             self._validation_error(
                 "Data inválida. Use YYYY-MM-DD (ex.: 2026-02-03).",
                 self.ent_date
@@ -2078,18 +2668,17 @@ class TripsEditorApp(tk.Tk):
             self._validation_error("Capacity deve ser um inteiro entre 1 e 10 (ex.: 3).", self.ent_capacity)
             return
 
-        stops = [self.stops_listbox.get(i).strip() for i in range(self.stops_listbox.size())]
-        stops = [s for s in stops if s]
+        stops = self._stops_from_listbox()
         if len(stops) < 2:
             self._validation_error("Stops deve ter pelo menos 2 cidades.", self.cmb_stop_new)
             return
 
         trip = self.data["trips"][self.current_index]
 
-        for i, t in enumerate(self.data["trips"]):
-            if i != self.current_index and t.get("id") == tid:
-                self._validation_error(f'Já existe outra viagem com id="{tid}".', self.ent_id)
-                return
+        other = self._get_id_index().get(tid)
+        if other is not None and other != self.current_index:
+            self._validation_error(f'Já existe outra viagem com id="{tid}".', self.ent_id)
+            return
 
         trip["id"] = tid
         trip["date"] = date
@@ -2099,12 +2688,8 @@ class TripsEditorApp(tk.Tk):
         trip["stops"] = stops
 
         self.dirty = True
-        self._update_dirty_ui()
-        self.refresh_ui()
-
-        self.listbox.selection_clear(0, tk.END)
-        self.listbox.selection_set(self.current_index)
-        self.listbox.see(self.current_index)
+        # the refresh keeps current_index selected
+        self._schedule_refresh()
         self._set_status("Alterações aplicadas")
 
         # (bookings são editadas na seção abaixo)
@@ -2140,11 +2725,7 @@ class TripsEditorApp(tk.Tk):
         try:
             self._reload_bookings([])
         except Exception:
-            try:
-                for iid in self.bookings.get_children():
-                    self.bookings.delete(iid)
-            except Exception:
-                pass
+            pass
 
         # Tabela de trechos
         try:
@@ -2153,7 +2734,7 @@ class TripsEditorApp(tk.Tk):
             pass
 
         if not trip:
-            self._update_controls_state()
+            self._schedule_ui_refresh()
             return
 
         # Preenche campos
@@ -2177,32 +2758,30 @@ class TripsEditorApp(tk.Tk):
         # Atualiza vagas por trecho
         self._refresh_segments_view(trip)
 
-        self._update_controls_state()
+        self._schedule_ui_refresh()
 
     def _reload_bookings(self, bookings: list[dict]):
         try:
-            for iid in self.bookings.get_children():
-                self.bookings.delete(iid)
+            # one `delete` call for all rows instead of one Tcl round-trip per row
+            self.bookings.delete(*self.bookings.get_children())
         except Exception:
             return
 
         if not isinstance(bookings, list):
             return
 
+        insert = self.bookings.insert
         for b in bookings:
-            try:
-                name = str(b.get("name", "")).strip()
-                frm = str(b.get("from", "")).strip()
-                to = str(b.get("to", "")).strip()
-                self.bookings.insert("", tk.END, values=(name, frm, to))
-            except Exception:
+            if not isinstance(b, dict):
                 continue
+            # str()/strip() return the same object for clean strings, so they only cost on odd input
+            insert("", tk.END, values=(str(b.get("name", "")).strip(), str(b.get("from", "")).strip(), str(b.get("to", "")).strip()))
 
     def on_select_booking(self, _evt=None):
         try:
             sel = self.bookings.selection()
             if not sel:
-                self._update_controls_state()
+                self._schedule_ui_refresh()
                 return
             iid = sel[0]
             vals = self.bookings.item(iid, "values")
@@ -2212,7 +2791,7 @@ class TripsEditorApp(tk.Tk):
                 self.var_b_to.set(vals[2])
         except Exception:
             pass
-        self._update_controls_state()
+        self._schedule_ui_refresh()
 
     def add_booking(self):
         self._push_undo()
@@ -2243,7 +2822,7 @@ class TripsEditorApp(tk.Tk):
         self._refresh_segments_view(trip)
         self._sync_stops_listbox_from_trip(trip)
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
         self._set_status("Reserva adicionada")
 
     def update_booking(self):
@@ -2286,7 +2865,7 @@ class TripsEditorApp(tk.Tk):
         self._refresh_segments_view(trip)
         self._sync_stops_listbox_from_trip(trip)
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
         self._set_status("Reserva atualizada")
 
     def remove_booking(self):
@@ -2316,7 +2895,7 @@ class TripsEditorApp(tk.Tk):
         self._reload_bookings(bookings)
         self._refresh_segments_view(trip)
         self.dirty = True
-        self._update_dirty_ui()
+        self._schedule_ui_refresh()
         self._set_status("Reserva removida")
 
 